@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Dry-run throughput over a simulated network share: every open/read gets
+--latency-ms of delay through remote.RemoteIO, and the same corpus is scanned
+sequentially, with plain -j threads, and in remote mode (threads plus a
+single-request tag read).
+
+    PYTHONPATH=src python benchmarks/bench_remote.py -n 500 --latency-ms 2
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from corpus import generate
+from retagger import core, remote
+
+
+def scan(root: Path, workers: int, latency: float, read_ahead: int, inode_order: bool) -> tuple[float, int]:
+    """Seconds for one pass, and how many I/O requests it made."""
+    io = remote.RemoteIO(retries=0, latency=latency)
+    calls = 0
+    run = io.run
+
+    def counted(op):
+        nonlocal calls
+        calls += 1  # only approximately right across threads, fine for a report
+        return run(op)
+
+    io.run = counted
+    config = core.RetagConfig(io=io, read_ahead=read_ahead)
+    paths = core.iter_audio_files(root, files_first=inode_order, inode_order=inode_order)
+    start = time.perf_counter()
+    for _ in core.process_library(paths, config, workers=workers):
+        pass
+    return time.perf_counter() - start, calls
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", "--count", type=int, default=500)
+    ap.add_argument("--latency-ms", type=float, default=2.0)
+    ap.add_argument("--in-flight", type=int, default=16)
+    args = ap.parse_args()
+
+    latency = args.latency_ms / 1000
+    cases = (
+        ("sequential", 1, core.PEEK_SIZE, False),
+        (f"-j {args.in_flight}", args.in_flight, core.PEEK_SIZE, False),
+        (f"--remote {args.in_flight}", args.in_flight, remote.REMOTE_READ_AHEAD, True),
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        generate(root, args.count)
+        print(f"files: {args.count}, latency: {args.latency_ms} ms per request")
+        for label, workers, read_ahead, inode_order in cases:
+            secs, calls = scan(root, workers, latency, read_ahead, inode_order)
+            print(f"{label:14s} {secs:7.2f}s  {args.count / secs:8.0f} files/s  {calls / args.count:5.2f} requests/file")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the name rules: norm, detect_features and
+clean_title_remixer_features, on a realistic mix of repeated names.
+
+"cold" clears core's memo caches before every pass, "warm" keeps them, which
+is what a long run over a library looks like.
+
+    PYTHONPATH=src python benchmarks/bench_rules.py
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import timeit
+from pathlib import Path
+
+from retagger import aliases, core
+
+NAMES = [
+    "Martin Solveig", "Dragonette", "Zedd", "Skrillex", "Björk", "JAY-Z",
+    "Kanye West", "Beyoncé", "Sigur Rós", "Tiësto", "Disclosure", "Sam Smith",
+    "Daft Punk", "Pharrell Williams", "Nile Rodgers", "Mø", "Röyksopp",
+]
+
+
+def make_cases(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    cases = []
+    for i in range(count):
+        main, feat, remixer = rng.sample(NAMES, 3)
+        title = f"Track {i % 50}"
+        if i % 4 == 0:
+            title += f" (feat. {feat} & {remixer}) [{remixer} Remix]"
+        elif i % 4 == 1:
+            title += f" ({remixer} Remix)"
+        cases.append(([main, feat, remixer], main, title))
+    return cases
+
+
+def clear_caches() -> None:
+    for module, fn in ((core, "norm"), (core, "_remix_window"), (aliases, "compact_key"), (aliases, "name_parts")):
+        cache_clear = getattr(getattr(module, fn, None), "cache_clear", None)
+        if cache_clear:
+            cache_clear()
+
+
+def make_index() -> aliases.ArtistIndex:
+    # Never saved: a folder's worth of the names above plus one duo.
+    index = aliases.ArtistIndex(Path(os.devnull))
+    index.folders["bench"] = {"signature": None, "names": [*NAMES, "Disclosure & Sam Smith"]}
+    index._rebuild()
+    return index
+
+
+INDEX = make_index()
+
+
+def run(label: str, fn, cases, number: int, quiet: bool = False) -> dict:
+    def cold():
+        clear_caches()
+        fn(cases)
+
+    def warm():
+        fn(cases)
+
+    warm()
+    results = {}
+    for mode, body in (("cold", cold), ("warm", warm)):
+        best = min(timeit.repeat(body, number=number, repeat=5)) / number
+        results[mode] = best / len(cases) * 1e6
+    if not quiet:
+        print(f"{label:32s} cold {results['cold']:7.2f} us/call   warm {results['warm']:7.2f} us/call")
+    return results
+
+
+RULES = {
+    "norm": lambda cs: [core.norm(n) for a, _, _ in cs for n in a],
+    "detect_features": lambda cs: [core.detect_features(a, m) for a, m, _ in cs],
+    "detect_features (artist index)": lambda cs: [core.detect_features(a, m, INDEX) for a, m, _ in cs],
+    "looks_like_remixer_in_title": lambda cs: [core.looks_like_remixer_in_title(t, a[2]) for a, _, t in cs],
+    "clean_title_remixer_features": lambda cs: [core.clean_title_remixer_features(t) for _, _, t in cs],
+    "analyse_batch (per row)": lambda cs: core.analyse_batch(
+        {"artist": ["/".join(a) for a, _, _ in cs], "title": [t for _, _, t in cs]}
+    ),
+}
+
+
+def bench_all(count: int = 2000, number: int = 5, quiet: bool = False) -> dict:
+    """{rule: {"cold": us/call, "warm": us/call}} for every rule."""
+    cases = make_cases(count)
+    return {label: run(label, fn, cases, number, quiet) for label, fn in RULES.items()}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", "--count", type=int, default=2000)
+    ap.add_argument("--number", type=int, default=5)
+    args = ap.parse_args()
+
+    bench_all(args.count, args.number)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
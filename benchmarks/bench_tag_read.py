@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Per-file cost of reading tags: the old ID3() + EasyID3() double load versus
+the single-parse read path used by core.process_file.
+
+    PYTHONPATH=src python benchmarks/bench_tag_read.py -n 2000
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from mutagen.easyid3 import EasyID3
+from mutagen.id3 import ID3
+
+from corpus import generate
+from retagger import core
+
+
+def legacy_read(path: Path) -> str:
+    ID3(path)
+    return EasyID3(path).get("artist", [""])[0]
+
+
+def single_parse_read(path: Path) -> str:
+    with core.open_tag_file(path, write=False) as fh:
+        return core.read_tags(fh).get("artist", [""])[0]
+
+
+def bench(fn, paths: list[Path], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for p in paths:
+            fn(p)
+        best = min(best, time.perf_counter() - start)
+    return best / len(paths)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", "--count", type=int, default=1000)
+    ap.add_argument("-r", "--rounds", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = generate(Path(tmp), args.count, headerless=False)
+        before = bench(legacy_read, paths, args.rounds)
+        after = bench(single_parse_read, paths, args.rounds)
+
+    print(f"files:        {args.count}")
+    print(f"ID3+EasyID3:  {before * 1e6:8.1f} us/file")
+    print(f"single parse: {after * 1e6:8.1f} us/file")
+    print(f"speedup:      {before / after:8.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite: builds a synthetic deemix-style corpus (see
+corpus.py) and times the walk, process_file in dry-run and write mode, and
+the name rules, plus CLI startup (`python -X importtime`). Results are
+printed as JSON so runs can be kept and compared between releases:
+
+    PYTHONPATH=src python benchmarks/suite.py -n 2000 --out bench-1.0.1.json
+    PYTHONPATH=src python benchmarks/suite.py -n 2000 --baseline bench-1.0.1.json
+
+With --baseline, each timing is compared against the saved run and the exit
+status is 1 if any got slower than --tolerance. The exit status is also 1 if
+`retagger --help` imports any of HEAVY_MODULES, or its imports take longer
+than --startup-budget-ms.
+
+Startup numbers include compiling retagger's modules when bytecode caching is
+off (PYTHONDONTWRITEBYTECODE), so compare runs made the same way.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from importlib import metadata
+from pathlib import Path
+
+import bench_rules
+from corpus import MIX, generate
+from retagger import core
+
+SUITE_VERSION = 1
+
+# Modules the CLI should only import once a command actually needs them.
+HEAVY_MODULES = ("mutagen", "sqlite3", "concurrent.futures", "ctypes", "customtkinter")
+
+
+def best_of(rounds: int, fn, setup=None) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def per_file(secs: float, count: int) -> dict:
+    return {"total_s": secs, "us_per_file": secs / count * 1e6 if count else 0.0}
+
+
+def run_suite(root: Path, rounds: int, rule_cases: int) -> dict:
+    paths = core.get_mp3_files(root)
+    results = {}
+
+    results["get_mp3_files"] = per_file(best_of(rounds, lambda: core.get_mp3_files(root)), len(paths))
+
+    dry = core.RetagConfig()
+    results["process_file_dry"] = per_file(
+        best_of(rounds, lambda: [core.process_file(p, dry) for p in paths]), len(paths)
+    )
+
+    # Write mode changes the files, so every round gets a fresh copy (untimed).
+    work = root.parent / "write-copy"
+    write = core.RetagConfig(write=True)
+    work_paths: list[Path] = []
+
+    def fresh_copy() -> None:
+        shutil.rmtree(work, ignore_errors=True)
+        shutil.copytree(root, work)
+        work_paths[:] = core.get_mp3_files(work)
+
+    results["process_file_write"] = per_file(
+        best_of(rounds, lambda: [core.process_file(p, write) for p in work_paths], setup=fresh_copy),
+        len(paths),
+    )
+    shutil.rmtree(work, ignore_errors=True)
+
+    results["rules_us_per_call"] = bench_rules.bench_all(rule_cases, quiet=True)
+
+    # One multi-artist file passed directly, the way a download hook calls retagger.
+    track = next(p for p in paths if is_candidate(p))
+    results["startup"] = run_startup(track, rounds)
+    return results
+
+
+def import_profile(cli_args: list[str]) -> tuple[float, set[str]]:
+    """Total import time (ms) and the modules imported by one `retagger` run."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "retagger", *cli_args],
+        capture_output=True,
+        text=True,
+    )
+    total_us = 0
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not cumulative_us.strip().isdigit():
+            continue  # the header line
+        modules.add(name.strip())
+        if len(name) - len(name.lstrip()) == 1:  # top level, not a nested import
+            total_us += int(cumulative_us)
+    return total_us / 1000, modules
+
+
+def wall_ms(cli_args: list[str], rounds: int) -> float:
+    cmd = [sys.executable, "-m", "retagger", *cli_args]
+    return best_of(rounds, lambda: subprocess.run(cmd, capture_output=True)) * 1000
+
+
+def run_startup(track: Path, rounds: int) -> dict:
+    results = {}
+    one_file = [str(track), "--no-cache", "--no-progress"]
+    for label, cli_args in (("help", ["--help"]), ("single_file", one_file)):
+        import_ms, modules = import_profile(cli_args)
+        results[label] = {
+            "wall_ms": wall_ms(cli_args, rounds),
+            "import_ms": import_ms,
+            "heavy_modules": sorted(
+                m for m in modules if any(m == h or m.startswith(h + ".") for h in HEAVY_MODULES)
+            ),
+        }
+    return results
+
+
+def is_candidate(path: Path) -> bool:
+    with open(path, "rb") as fh:
+        artist, _ = core.peek_artist(fh)
+    return artist is not None and "/" in artist
+
+
+def timings(results: dict, prefix: str = "") -> dict:
+    """Flatten to {"section.metric": seconds-or-us} for comparing runs."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(timings(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> bool:
+    ok = True
+    old = timings(baseline["results"])
+    for name, new in timings(current["results"]).items():
+        if name not in old or not old[name]:
+            continue
+        ratio = new / old[name]
+        slower = ratio > 1 + tolerance
+        ok = ok and not slower
+        mark = "  SLOWER" if slower else ""
+        print(f"{name:50s} {old[name]:12.3f} -> {new:12.3f}  x{ratio:5.2f}{mark}", file=sys.stderr)
+    return ok
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", "--count", type=int, default=1000)
+    ap.add_argument("-r", "--rounds", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--rule-cases", type=int, default=2000)
+    ap.add_argument("--out", type=Path, help="Write the JSON report here instead of stdout")
+    ap.add_argument("--baseline", type=Path, help="Earlier report to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.10, help="Allowed slowdown vs --baseline (default: 0.10)")
+    ap.add_argument(
+        "--startup-budget-ms",
+        type=float,
+        help="Fail if the imports behind `retagger --help` take longer than this",
+    )
+    args = ap.parse_args()
+
+    try:
+        version = metadata.version("retagger")
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "corpus"
+        generate(root, args.count, args.seed)
+        results = run_suite(root, args.rounds, args.rule_cases)
+
+    report = {
+        "suite": SUITE_VERSION,
+        "retagger": version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "count": args.count,
+        "seed": args.seed,
+        "rounds": args.rounds,
+        "mix": dict(MIX),
+        "results": results,
+    }
+    data = json.dumps(report, indent=2)
+    if args.out:
+        args.out.write_text(data + "\n")
+    else:
+        print(data)
+
+    ok = True
+    help_startup = results["startup"]["help"]
+    if help_startup["heavy_modules"]:
+        print(f"retagger --help imports {', '.join(help_startup['heavy_modules'])}", file=sys.stderr)
+        ok = False
+    if args.startup_budget_ms is not None and help_startup["import_ms"] > args.startup_budget_ms:
+        print(
+            f"retagger --help imports took {help_startup['import_ms']:.1f} ms "
+            f"(budget {args.startup_budget_ms:.1f} ms)",
+            file=sys.stderr,
+        )
+        ok = False
+    if args.baseline:
+        ok = compare(report, json.loads(args.baseline.read_text()), args.tolerance) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
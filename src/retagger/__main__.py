@@ -2,17 +2,44 @@
 from __future__ import annotations
 
 import argparse
+import itertools
+import json
+import os
 import sys
 from pathlib import Path
 
-from retagger import core
+from typing import Optional
 
+# Only what building the parsers needs; each command imports the rest, so
+# 'retagger --help' and hook-style single-file runs start quickly.
+from retagger import output
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
 
-def main() -> int:
     ap = argparse.ArgumentParser(
-        description="Convert Artist 'Main/Feat' -> Artist=Main, Title+='(ft. Feat...)', excluding remixers in title"
+        description="Convert Artist 'Main/Feat' -> Artist=Main, Title+='(ft. Feat...)', excluding remixers in title",
+        epilog="Other commands: 'retagger apply PLAN' writes a plan saved with --plan-out; "
+        "'retagger watch ROOT' retags new downloads as they land; "
+        "'retagger undo JOURNAL' reverts a run saved with --journal.",
+    )
+    ap.add_argument(
+        "paths",
+        nargs="*",
+        type=Path,
+        metavar="PATH",
+        help="Folders to scan (recursive) and/or individual files to process",
+    )
+    ap.add_argument(
+        "--files-from",
+        type=Path,
+        metavar="FILE",
+        help="Also process the files listed in FILE ('-' for stdin), one per line "
+        "or NUL-separated (find -print0); nothing is walked",
     )
-    ap.add_argument("root", type=Path, help="Folder to scan (recursive)")
     ap.add_argument("--delimiter", default="/", help="Artist delimiter (default: /)")
     ap.add_argument(
         "--write", action="store_true", help="Actually write changes (otherwise dry-run)"
@@ -22,45 +49,711 @@ def main() -> int:
         action="store_true",
         help="Set albumartist to main artist",
     )
-    args = ap.parse_args()
+    ap.add_argument(
+        "--group-albums",
+        action="store_true",
+        help="Work one folder at a time and give every track the main artist most "
+        "of the folder agrees on, so an album comes out consistent",
+    )
+    ap.add_argument(
+        "--artist-index",
+        action="store_true",
+        help="Keep an index of every artist name in the scanned folders (refreshed "
+        "for changed folders before each run) and use it to match spellings such "
+        "as 'Jay Z'/'JAY-Z' and to keep known acts like 'A & B' together",
+    )
+    ap.add_argument(
+        "--formats",
+        metavar="LIST",
+        help="Comma-separated tag formats to look for when walking folders: "
+        "mp3, flac, ogg, opus, m4a (default: all)",
+    )
+    ap.add_argument(
+        "--max-depth",
+        type=int,
+        default=None,
+        help="Only descend this many folder levels below root (default: unlimited)",
+    )
+    ap.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="Skip files/folders matching GLOB (name or path relative to root); repeatable",
+    )
+    ap.add_argument(
+        "--sort",
+        action="store_true",
+        help="Process files in sorted path order (still streamed)",
+    )
+    ap.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of files to process in parallel (default: 1)",
+    )
+    ap.add_argument(
+        "--executor",
+        choices=("thread", "process"),
+        default="thread",
+        help="Worker pool type used when --jobs > 1 (default: thread)",
+    )
+    ap.add_argument(
+        "--remote",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Network storage (NFS/SMB) mode: keep N files in flight on threads, "
+        "read each tag in one request, walk folders in inode order and retry "
+        "transient I/O errors (e.g. --remote 32)",
+    )
+    ap.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="With --remote, how often to retry an I/O error that may be transient (default: 3)",
+    )
+    ap.add_argument(
+        "--simulate-latency",
+        type=float,
+        default=0.0,
+        metavar="MS",
+        help="Testing aid: add this much delay to every open/read/write, like a remote share",
+    )
+    ap.add_argument(
+        "--simulate-faults",
+        type=float,
+        default=0.0,
+        metavar="FRACTION",
+        help="Testing aid: fail this fraction of I/O operations with EIO",
+    )
+    ap.add_argument(
+        "--max-files-per-sec",
+        type=float,
+        default=0.0,
+        metavar="N",
+        help="Open at most N files a second (cache hits don't count), so a "
+        "background run leaves the disks to other services",
+    )
+    ap.add_argument(
+        "--max-mb-per-sec",
+        type=float,
+        default=0.0,
+        metavar="MB",
+        help="Open at most this many MB of files a second (by file size)",
+    )
+    ap.add_argument(
+        "--memory-limit",
+        type=int,
+        default=0,
+        metavar="MB",
+        help="Resident memory ceiling: past it, caches are dropped and fewer files "
+        "are kept in flight (this process only, not --executor process workers)",
+    )
+    ap.add_argument(
+        "--background",
+        action="store_true",
+        help="Run at the lowest CPU and I/O priority the system allows",
+    )
+    ap.add_argument(
+        "--writers",
+        type=int,
+        default=0,
+        help="With --write, save files on N background writer threads while "
+        "reading continues (default: 0, save inline)",
+    )
+    ap.add_argument(
+        "--reserve-padding",
+        type=int,
+        default=0,
+        metavar="BYTES",
+        help="Keep at least this much tag padding so later retags fit in place "
+        "(e.g. 16384). The first save of every file with less padding than this "
+        "is a full rewrite of the file, even when the change would have fit",
+    )
+    ap.add_argument(
+        "--format",
+        choices=output.FORMATS,
+        default="text",
+        help="Output format: human-readable text (default), or one JSON object "
+        "(jsonl) / CSV row per result for piping into other tools",
+    )
+    ap.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print per-stage timings, a per-file histogram and the slowest files",
+    )
+    ap.add_argument(
+        "--stats-json",
+        type=Path,
+        metavar="FILE",
+        help="Write the same timings as JSON to FILE ('-' for stdout)",
+    )
+    ap.add_argument(
+        "--profile",
+        type=Path,
+        metavar="FILE",
+        help="Run under cProfile and dump pstats data to FILE "
+        "(only covers this process, not --executor process workers)",
+    )
+    ap.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Don't read or update the scan cache; process every file",
+    )
+    ap.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="Discard the scan cache and rebuild it from this run",
+    )
+    ap.add_argument(
+        "--plan-out",
+        type=Path,
+        metavar="FILE",
+        help="Save the changes found by this dry run to FILE (JSON Lines) "
+        "for 'retagger apply FILE'",
+    )
+    ap.add_argument(
+        "--journal",
+        type=Path,
+        metavar="FILE",
+        help="With --write, log the old and new tags of every file to FILE before "
+        "saving it, for 'retagger undo FILE' or --resume",
+    )
+    ap.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the interrupted run recorded in --journal: files it already "
+        "saved are skipped and new entries are appended",
+    )
+    ap.add_argument(
+        "--no-progress",
+        action="store_true",
+        help="Don't show the live progress line (only shown when stderr is a terminal)",
+    )
+    args = ap.parse_args(argv)
 
-    root: Path = args.root
-    if not root.exists():
-        print(f"Path not found: {root}")
-        return 1
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(run, ap, args)
+        finally:
+            profiler.dump_stats(args.profile)
+            print(f"Profile written to {args.profile}", file=sys.stderr)
+    return run(ap, args)
+
+
+def run(ap: argparse.ArgumentParser, args: argparse.Namespace) -> int:
+    from retagger import core, stats
+    if args.jobs < 1:
+        ap.error("--jobs must be at least 1")
+    if args.writers < 0:
+        ap.error("--writers can't be negative")
+    if args.reserve_padding < 0:
+        ap.error("--reserve-padding can't be negative")
+    if args.writers and args.executor != "thread":
+        ap.error("--writers needs --executor thread")
+    if args.plan_out and args.write:
+        ap.error("--plan-out records a dry run; leave out --write")
+    if args.journal and not args.write:
+        ap.error("--journal needs --write")
+    if args.journal and args.executor != "thread":
+        ap.error("--journal needs --executor thread")
+    if args.artist_index and args.executor != "thread":
+        ap.error("--artist-index needs --executor thread")
+    if args.remote < 0 or args.retries < 0:
+        ap.error("--remote and --retries can't be negative")
+    if args.simulate_latency < 0 or not 0 <= args.simulate_faults < 1:
+        ap.error("--simulate-latency can't be negative and --simulate-faults must be in [0, 1)")
+    remote_io = args.remote or args.simulate_latency or args.simulate_faults
+    if remote_io and args.executor != "thread":
+        ap.error("--remote and --simulate-* need --executor thread")
+    if args.max_files_per_sec < 0 or args.max_mb_per_sec < 0 or args.memory_limit < 0:
+        ap.error("--max-files-per-sec, --max-mb-per-sec and --memory-limit can't be negative")
+    if args.resume and not args.journal:
+        ap.error("--resume needs --journal FILE")
+    if args.journal and args.journal.exists() and not args.resume:
+        ap.error(f"{args.journal} already exists; pass --resume to continue that run")
 
-    mp3s = core.get_mp3_files(root)
-    if not mp3s:
-        print("No mp3 files found.")
-        return 0
+    if not args.paths and not args.files_from:
+        ap.error("give at least one PATH or --files-from")
+    for path in args.paths:
+        if not path.exists():
+            print(f"Path not found: {path}")
+            return 1
+
+    # Folders are walked; files given directly (a download hook handing over
+    # one new track, or a list on stdin) go straight to processing.
+    roots = [p for p in args.paths if p.is_dir()]
+    files = [p for p in args.paths if not p.is_dir()]
+
+    extensions = None
+    if args.formats:
+        formats = [f.strip().lower() for f in args.formats.split(",") if f.strip()]
+        unknown = sorted(set(formats) - set(core.backend_names()))
+        if unknown:
+            ap.error(f"unknown format(s) in --formats: {', '.join(unknown)}")
+        extensions = core.audio_extensions(formats)
+
+    def walk(root: Path, sort: bool = args.sort):
+        return core.iter_audio_files(
+            root,
+            max_depth=args.max_depth,
+            exclude=args.exclude,
+            sort=sort,
+            extensions=extensions,
+            files_first=args.group_albums or bool(args.remote),
+            inode_order=bool(args.remote) and not sort,
+        )
+
+    sources: list = [walk(root) for root in roots]
+    sources.append(files)
+    list_stream = None
+    if args.files_from:
+        if str(args.files_from) == "-":
+            list_stream = sys.stdin.buffer
+        else:
+            try:
+                list_stream = open(args.files_from, "rb")
+            except OSError as e:
+                print(e, file=sys.stderr)
+                return 1
+        sources.append(core.read_path_list(list_stream))
+    tracks = itertools.chain.from_iterable(sources)
 
     config = core.RetagConfig(
         delimiter=args.delimiter,
         write=args.write,
         set_albumartist=args.set_albumartist,
+        reserve_padding=args.reserve_padding,
+        group_albums=args.group_albums,
     )
+    if remote_io:
+        from retagger import remote
+
+        config.io = remote.RemoteIO(
+            retries=args.retries if args.remote else 0,
+            latency=args.simulate_latency / 1000,
+            faults=args.simulate_faults,
+        )
+        if args.remote:
+            config.read_ahead = remote.REMOTE_READ_AHEAD
+    jobs = args.remote or args.jobs
 
+    throttle = None
+    if args.max_files_per_sec or args.max_mb_per_sec or args.memory_limit or args.background:
+        from retagger import limits
+
+        config.limits = limits.ResourceLimits(
+            files_per_s=args.max_files_per_sec,
+            mb_per_s=args.max_mb_per_sec,
+            memory_mb=args.memory_limit,
+            background=args.background,
+        )
+        throttle = limits.Throttle(config.limits)
+        if args.background:
+            # Before any worker, writer or index thread exists, so they all inherit it.
+            throttle.priority = limits.lower_priority()
+
+    index_note = None
+    if args.artist_index:
+        from retagger import aliases
+
+        index = aliases.ArtistIndex.load(delimiter=args.delimiter)
+        read, unchanged = index.update(
+            roots, max_depth=args.max_depth, exclude=args.exclude, extensions=extensions
+        )
+        try:
+            index.save()
+        except OSError as e:
+            print(f"Couldn't save the artist index: {e}", file=sys.stderr)
+        config.artist_index = index
+        index_note = (
+            f"\nArtist index: {len(index)} names, {len(index.acts)} acts "
+            f"({read} folders read, {unchanged} unchanged)"
+        )
+
+    run_journal = None
+    if args.journal:
+        from retagger import journal
+
+        done: set[Path] = set()
+        try:
+            if args.resume and args.journal.exists():
+                done = journal.completed_paths(args.journal)
+            run_journal = journal.Journal(args.journal, config)
+        except (OSError, ValueError) as e:
+            print(e, file=sys.stderr)
+            return 1
+        if done:
+            tracks = (p for p in tracks if Path(os.path.abspath(p)) not in done)
+
+    scan_cache = None
+    if not args.no_cache:
+        from retagger import cache
+
+        scan_cache = cache.ScanCache(config=config)
+        if args.rebuild_cache:
+            scan_cache.clear()
+
+    run_stats = None
+    if args.stats or args.stats_json:
+        run_stats = stats.RunStats()
+
+    write_queue = None
+    if args.write and args.writers:
+        write_queue = core.WriteQueue(
+            writers=args.writers, stats=run_stats, journal=run_journal, io=config.io
+        )
+
+    # Results stream through a large buffer rather than a write per line. In the
+    # machine-readable formats stdout carries nothing but records, so everything
+    # else goes to stderr.
+    out = open(
+        sys.stdout.fileno(), "w", encoding="utf-8", newline="", buffering=1 << 16, closefd=False
+    )
+    writer = output.make_writer(args.format, out)
+    info_stream = out if args.format == "text" else sys.stderr
+
+    def info(*parts) -> None:
+        print(*parts, file=info_stream)
+
+    plan_writer = None
+    if args.plan_out:
+        from retagger import plan
+
+        plan_writer = plan.PlanWriter(args.plan_out, config)
+
+    run_progress = status = None
+    if not args.no_progress and sys.stderr.isatty():
+        from retagger import progress
+
+        run_progress = progress.Progress()
+        if list_stream is None and not args.remote:
+            # A second, cheap walk sizes the run for the ETA while files stream in.
+            # Not on a network share, where it would double the directory traffic.
+            run_progress.count(itertools.chain(files, *(walk(root, False) for root in roots)))
+        status = progress.StatusLine(run_progress, sys.stderr, before_draw=out.flush)
+
+    scanned_count = 0
     changed_count = 0
+    error_count = 0
+    skipped_count = 0
+    interrupted = False
+    totals = core.WriteTotals()
 
-    for p in mp3s:
-        result = core.process_file(p, config)
+    results = core.process_library(
+        tracks,
+        config,
+        workers=jobs,
+        executor=args.executor,
+        cache=scan_cache,
+        write_queue=write_queue,
+        stats=run_stats,
+        journal=run_journal,
+        progress=run_progress,
+        throttle=throttle,
+    )
+    try:
+        for _, result in results:
+            scanned_count += 1
+            if status is not None:
+                status.tick()
+            if not result:
+                continue
+            writer.write(result)
+            if result.error:
+                error_count += 1
+            elif result.skip_reason:
+                skipped_count += 1
+            elif result.changed:
+                changed_count += 1
+                totals.add(result.in_place, result.bytes_written)
+                if plan_writer is not None:
+                    plan_writer.add(result)
+    except KeyboardInterrupt:
+        interrupted = True
+        info("\nInterrupted.")
+    if status is not None:
+        status.clear()
 
-        if result:
+    write_failures = 0
+    if write_queue is not None:
+        # On Ctrl-C, saves that haven't started yet are dropped, not half-done.
+        write_queue.close(drain=not interrupted)
+        for failed in write_queue.failures:
+            writer.write(failed, "write_failed")
+        for dropped in write_queue.discarded:
+            writer.write(dropped, "not_written")
+        write_failures = len(write_queue.failures)
+        changed_count -= write_failures + len(write_queue.discarded)
+        totals = write_queue.totals
+
+    if run_journal is not None:
+        run_journal.close()
+        if args.resume and done:
+            info(f"\nResumed: skipped {len(done)} files already saved by {args.journal}")
+        info(f"\nJournal: {args.journal} (undo with 'retagger undo {args.journal}')")
+
+    if list_stream is not None and list_stream is not sys.stdin.buffer:
+        list_stream.close()
+
+    if not scanned_count:
+        info("No audio files found.")
+
+    if plan_writer is not None:
+        plan_writer.close()
+        info(f"\nPlan: {plan_writer.count} changes saved to {args.plan_out}")
+
+    cache_hits = pruned = 0
+    if scan_cache is not None:
+        pruned = sum(scan_cache.prune(root) for root in roots)
+        scan_cache.close()
+        cache_hits = scan_cache.hits
+        info(f"\nCache: {cache_hits} files answered from cache, {pruned} stale entries pruned")
+
+    if index_note is not None:
+        info(index_note)
+
+    if config.io is not None and (config.io.retried or config.io.failed):
+        info(
+            f"\nRemote I/O: {config.io.retried} retries, "
+            f"{config.io.failed} operations still failing after {config.io.retries} retries"
+        )
+
+    if throttle is not None:
+        info(f"\n{throttle.summary()}")
+
+    if args.write and (totals.patched or totals.rewritten):
+        info(
+            f"\nSaved in place: {totals.patched} files ({totals.bytes_patched} bytes), "
+            f"full rewrites: {totals.rewritten} files ({totals.bytes_rewritten} bytes)"
+        )
+
+    writer.summary(
+        {
+            "scanned": scanned_count,
+            "changed": changed_count,
+            "errors": error_count,
+            "skipped": skipped_count,
+            "write_failures": write_failures,
+            "write": args.write,
+            "interrupted": interrupted,
+            "cache_hits": cache_hits,
+            "bytes_patched": totals.bytes_patched,
+            "bytes_rewritten": totals.bytes_rewritten,
+        }
+    )
+    info(f"\nDone. Files matched/changed: {changed_count} (write={'yes' if args.write else 'no'})")
+
+    if run_stats is not None:
+        if args.stats:
+            info()
+            info(run_stats.summary())
+        if args.stats_json:
+            data = json.dumps(run_stats.to_dict(), indent=2)
+            if str(args.stats_json) == "-":
+                info(data)
+            else:
+                args.stats_json.write_text(data + "\n")
+
+    out.flush()
+    return 0
+
+
+def apply_main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(
+        prog="retagger apply",
+        description="Write the changes saved by 'retagger ROOT --plan-out FILE' without "
+        "re-scanning. Files that changed since the plan was made are skipped.",
+    )
+    ap.add_argument("plan", type=Path, help="Plan file written by --plan-out")
+    ap.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of files to write in parallel (default: 1)",
+    )
+    ap.add_argument(
+        "--reserve-padding",
+        type=int,
+        default=0,
+        metavar="BYTES",
+        help="Keep at least this much tag padding; the first save of a file with "
+        "less is a full rewrite",
+    )
+    ap.add_argument("--format", choices=output.FORMATS, default="text", help="Output format")
+    args = ap.parse_args(argv)
+
+    if args.jobs < 1:
+        ap.error("--jobs must be at least 1")
+    from retagger import core, plan
+
+    if not args.plan.exists():
+        print(f"Plan not found: {args.plan}", file=sys.stderr)
+        return 1
+
+    out = open(
+        sys.stdout.fileno(), "w", encoding="utf-8", newline="", buffering=1 << 16, closefd=False
+    )
+    writer = output.make_writer(args.format, out)
+    info_stream = out if args.format == "text" else sys.stderr
+
+    counts = {"planned": 0, "changed": 0, "skipped": 0, "errors": 0}
+    totals = core.WriteTotals()
+    try:
+        for result in plan.apply_plan(
+            plan.read_plan(args.plan), workers=args.jobs, reserve_padding=args.reserve_padding
+        ):
+            counts["planned"] += 1
+            writer.write(result)
             if result.error:
-                print(f"[skip] {result.path} (couldn't read tags: {result.error})")
-                continue
+                counts["errors"] += 1
+            elif result.skip_reason:
+                counts["skipped"] += 1
+            else:
+                counts["changed"] += 1
+                totals.add(result.in_place, result.bytes_written)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    writer.summary({**counts, "write": True, "bytes_patched": totals.bytes_patched, "bytes_rewritten": totals.bytes_rewritten})
+    print(
+        f"\nDone. Applied {counts['changed']} of {counts['planned']} planned changes "
+        f"({counts['skipped']} skipped, {counts['errors']} errors)",
+        file=info_stream,
+    )
+    out.flush()
+    return 0 if not counts["errors"] else 1
 
-            if result.changed:
-                print(f"\n{result.path}")
-                print(f"  Artist: {result.old_artist}  ->  {result.new_artist}")
-                print(f"  Title : {result.old_title}  ->  {result.new_title}")
-                changed_count += 1
 
+def undo_main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(
+        prog="retagger undo",
+        description="Revert the writes recorded by 'retagger ROOT --write --journal FILE', "
+        "newest first. Files whose tags changed since are left alone.",
+    )
+    ap.add_argument("journal", type=Path, help="Journal file written by --journal")
+    ap.add_argument("--format", choices=output.FORMATS, default="text", help="Output format")
+    args = ap.parse_args(argv)
+
+    from retagger import journal
+
+    if not args.journal.exists():
+        print(f"Journal not found: {args.journal}", file=sys.stderr)
+        return 1
+
+    out = open(
+        sys.stdout.fileno(), "w", encoding="utf-8", newline="", buffering=1 << 16, closefd=False
+    )
+    writer = output.make_writer(args.format, out)
+    info_stream = out if args.format == "text" else sys.stderr
+
+    counts = {"journaled": 0, "restored": 0, "skipped": 0, "errors": 0}
+    try:
+        for result in journal.undo_journal(args.journal):
+            counts["journaled"] += 1
+            if result.error:
+                counts["errors"] += 1
+            elif result.skip_reason:
+                counts["skipped"] += 1
+            else:
+                counts["restored"] += 1
+            writer.write(result)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("\nInterrupted.", file=info_stream)
+
+    writer.summary({**counts, "write": True})
     print(
-        f"\nDone. Files matched/changed: {changed_count} (write={'yes' if args.write else 'no'})"
+        f"\nDone. Restored {counts['restored']} of {counts['journaled']} journaled files "
+        f"({counts['skipped']} skipped, {counts['errors']} errors)",
+        file=info_stream,
     )
+    out.flush()
+    return 0 if not counts["errors"] else 1
+
+
+def watch_main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(
+        prog="retagger watch",
+        description="Keep running and retag new or modified audio files under ROOT once "
+        "they've finished downloading. Uses inotify on Linux, polling elsewhere.",
+    )
+    ap.add_argument("root", type=Path, help="Folder to watch (recursive)")
+    ap.add_argument("--delimiter", default="/", help="Artist delimiter (default: /)")
+    ap.add_argument(
+        "--write", action="store_true", help="Actually write changes (otherwise dry-run)"
+    )
+    ap.add_argument(
+        "--set-albumartist",
+        action="store_true",
+        help="Set albumartist to main artist",
+    )
+    ap.add_argument(
+        "--debounce",
+        type=float,
+        default=2.0,
+        metavar="SECS",
+        help="Wait until a file has been quiet and the same size for this long (default: 2)",
+    )
+    ap.add_argument(
+        "--poll",
+        action="store_true",
+        help="Use the polling watcher even where inotify is available",
+    )
+    ap.add_argument(
+        "--interval",
+        type=float,
+        default=10.0,
+        metavar="SECS",
+        help="Seconds between scans for the polling watcher (default: 10)",
+    )
+    ap.add_argument("--format", choices=output.FORMATS, default="text", help="Output format")
+    args = ap.parse_args(argv)
+
+    from retagger import core, watch
+
+    if not args.root.is_dir():
+        print(f"Path not found: {args.root}", file=sys.stderr)
+        return 1
+
+    config = core.RetagConfig(
+        delimiter=args.delimiter,
+        write=args.write,
+        set_albumartist=args.set_albumartist,
+    )
+    writer = output.make_writer(args.format, sys.stdout)
+
+    def on_result(path: Path, result: Optional[core.ChangeResult]) -> None:
+        if result:
+            writer.write(result)
+            sys.stdout.flush()
+
+    print(f"Watching {args.root} (write={'yes' if args.write else 'no'}), Ctrl-C to stop", file=sys.stderr)
+    try:
+        watch.watch(
+            args.root,
+            config,
+            on_result,
+            debounce=args.debounce,
+            poll=args.poll,
+            interval=args.interval,
+        )
+    except KeyboardInterrupt:
+        pass
     return 0
 
 
+COMMANDS = {"apply": apply_main, "undo": undo_main, "watch": watch_main}
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from retagger.core import (
+    MAIN_ARTIST_SPLIT_RE,
+    NORM_CACHE_SIZE,
+    album_groups,
+    backend_for,
+    iter_audio_files,
+    norm,
+)
+from retagger.paths import get_config_dir
+
+# Bump when the file layout changes; older indexes are simply rebuilt.
+INDEX_VERSION = 1
+
+
+def default_index_path() -> Path:
+    return get_config_dir() / "artist-index.json"
+
+
+@lru_cache(maxsize=NORM_CACHE_SIZE)
+def compact_key(name: str) -> str:
+    """norm() without the spaces, so "JAY-Z", "Jay Z" and "JayZ" share a key."""
+    return norm(name).replace(" ", "") or "".join(name.casefold().split())
+
+
+@lru_cache(maxsize=NORM_CACHE_SIZE)
+def name_parts(name: str) -> frozenset:
+    """Keys of a credit and of each name in it: "Disclosure & Sam Smith" -> 3 keys."""
+    parts = [p.strip() for p in MAIN_ARTIST_SPLIT_RE.split(name) if p.strip()]
+    return frozenset([compact_key(name), *map(compact_key, parts)])
+
+
+def credited_names(artist: str, albumartist: str, delimiter: str) -> List[str]:
+    names = [a.strip() for a in artist.split(delimiter)] + [albumartist.strip()]
+    return [n for n in names if n]
+
+
+def _folder_signature(paths: Sequence[Path]) -> Optional[list]:
+    # Any new, removed or re-tagged file in the folder changes this.
+    try:
+        mtimes = [os.stat(p).st_mtime_ns for p in paths]
+    except OSError:
+        return None
+    return [len(mtimes), max(mtimes)]
+
+
+def _read_names(path: Path, delimiter: str) -> List[str]:
+    try:
+        with open(path, "rb") as fh:
+            tags = backend_for(path).read(fh)
+    except Exception:
+        return []
+    if tags is None:
+        return []
+    artist = (tags.get("artist", [""])[0] or "").strip()
+    albumartist = (tags.get("albumartist", [""])[0] or "").strip()
+    return credited_names(artist, albumartist, delimiter)
+
+
+class ArtistIndex:
+    """
+    Every artist name credited across the library, kept on disk between runs
+    and looked up by compact_key, so spellings that only differ in case,
+    accents, punctuation or spacing count as one artist.
+
+    It also knows the library's acts: credits made of several names, such as
+    "Disclosure & Sam Smith" as an albumartist or a lone TPE1. A track tagged
+    "Disclosure/Sam Smith" with no albumartist then keeps the duo as its main
+    artist instead of featuring Sam Smith (see act_for).
+
+    Names are stored per folder with a signature of its files, so update()
+    only re-reads folders that changed since the last run. Lookups use the
+    names and acts as they were when the index was loaded or last updated.
+    """
+
+    def __init__(self, path: Optional[Path] = None, delimiter: str = "/"):
+        self.path = path or default_index_path()
+        self.delimiter = delimiter
+        self.folders: dict[str, dict] = {}
+        self.names: dict[str, str] = {}
+        self.acts: dict[frozenset, str] = {}
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None, delimiter: str = "/") -> ArtistIndex:
+        """The saved index, or an empty one if there's none (or it's unusable)."""
+        index = cls(path, delimiter)
+        try:
+            data = json.loads(index.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        if data.get("version") == INDEX_VERSION and data.get("delimiter") == delimiter:
+            index.folders = data.get("folders", {})
+        else:
+            index.dirty = True
+        index._rebuild()
+        return index
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        data = {"version": INDEX_VERSION, "delimiter": self.delimiter, "folders": self.folders}
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    def update(
+        self,
+        roots: Iterable[Path],
+        *,
+        max_depth: Optional[int] = None,
+        exclude: Sequence[str] = (),
+        extensions: Optional[Sequence[str]] = None,
+    ) -> Tuple[int, int]:
+        """
+        Bring the index up to date with the folders under roots: re-read the
+        ones whose files changed, drop the ones that are gone. Returns
+        (folders read, folders unchanged).
+        """
+        read = unchanged = 0
+        for root in roots:
+            prefix = os.path.join(os.path.abspath(root), "")
+            seen = set()
+            files = iter_audio_files(
+                root, max_depth=max_depth, exclude=exclude, extensions=extensions, files_first=True
+            )
+            for group in album_groups(files):
+                folder = os.path.abspath(group[0].parent)
+                seen.add(folder)
+                signature = _folder_signature(group)
+                entry = self.folders.get(folder)
+                if entry is not None and signature is not None and entry["signature"] == signature:
+                    unchanged += 1
+                    continue
+                names = [n for p in group for n in _read_names(p, self.delimiter)]
+                self.folders[folder] = {"signature": signature, "names": names}
+                self.dirty = True
+                read += 1
+            for folder in [f for f in self.folders if f.startswith(prefix) or f == prefix[:-1]]:
+                if folder not in seen:
+                    del self.folders[folder]
+                    self.dirty = True
+        if self.dirty:
+            self._rebuild()
+        return read, unchanged
+
+    def _rebuild(self) -> None:
+        spellings: dict[str, Counter] = defaultdict(Counter)
+        for entry in self.folders.values():
+            for name in entry["names"]:
+                spellings[compact_key(name)][name] += 1
+        self.names = {key: counts.most_common(1)[0][0] for key, counts in spellings.items()}
+        self.acts = {}
+        for name in self.names.values():
+            parts = name_parts(name) - {compact_key(name)}
+            if len(parts) >= 2:
+                self.acts.setdefault(parts, name)
+
+    def key(self, name: str) -> str:
+        return compact_key(name)
+
+    def parts(self, name: str) -> frozenset:
+        return name_parts(name)
+
+    def __contains__(self, name: str) -> bool:
+        return compact_key(name) in self.names
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def canonical(self, name: str) -> str:
+        """The library's most common spelling of name."""
+        return self.names.get(compact_key(name), name)
+
+    def act_for(self, artists: Sequence[str]) -> Optional[str]:
+        """
+        The known act made up of the leading artists of a track's list, if
+        any: ["Disclosure", "Sam Smith", "X"] -> "Disclosure & Sam Smith".
+        """
+        keys = [compact_key(a) for a in artists]
+        for n in range(len(keys), 1, -1):
+            act = self.acts.get(frozenset(keys[:n]))
+            if act is not None:
+                return act
+        return None
+
+    def digest(self) -> str:
+        """Changes whenever the acts do, the only part that changes rule outcomes."""
+        return hashlib.sha1("\0".join(sorted(self.acts.values())).encode("utf-8")).hexdigest()
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+from retagger.core import ChangeResult, RetagConfig
+from retagger.paths import get_config_dir
+
+# Bump whenever the rules in core change what a file would be retagged to,
+# so results cached by an older version are not trusted.
+RULES_VERSION = 1
+
+# Bump when the table layout changes; older caches are simply dropped.
+# (3: paths are stored absolute.)
+SCHEMA_VERSION = 3
+
+COMMIT_EVERY = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    old_artist TEXT,
+    new_artist TEXT,
+    old_title TEXT,
+    new_title TEXT,
+    skip_reason TEXT
+)
+"""
+
+
+def cache_key(path: Path) -> str:
+    # Absolute, so "lib" and "/abs/lib" share rows and prune() doesn't depend on the cwd.
+    return os.path.abspath(path)
+
+
+def default_cache_path() -> Path:
+    return get_config_dir() / "scan-cache.sqlite3"
+
+
+def config_fingerprint(config: RetagConfig) -> str:
+    # `write` is deliberately left out: a dry run and a write run classify
+    # files identically, only what happens afterwards differs.
+    key = f"{RULES_VERSION}\0{config.delimiter}\0{config.set_albumartist}"
+    if config.group_albums:
+        key += "\0albums"
+    if config.artist_index is not None:
+        key += "\0index " + config.artist_index.digest()
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class ScanCache:
+    """
+    On-disk index of files we've already looked at, keyed on path and
+    validated against (mtime, size) plus the config fingerprint.
+
+    Only outcomes that can be replayed safely are cached: "unchanged" and
+    "skipped" files, and "changed" files seen on a dry run (replayed on later
+    dry runs only). Errors and files we've just written are never cached.
+    """
+
+    def __init__(self, path: Optional[Path] = None, config: Optional[RetagConfig] = None):
+        self.path = path or default_cache_path()
+        self.fingerprint = config_fingerprint(config or RetagConfig())
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS files")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+        self._pending = 0
+        self._seen: set[str] = set()
+        self.track_seen = True
+        # Counted by process_library, by whether a valid entry was actually
+        # used: a write run redoes cached changes, and an album only comes
+        # from the cache when all of its tracks do.
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, path: Path, st: os.stat_result) -> Optional[tuple[str, Optional[ChangeResult]]]:
+        """
+        Return (outcome, result) when the cached entry is still valid for
+        this file, or None if the file has to be processed.
+        """
+        key = cache_key(path)
+        if self.track_seen:
+            self._seen.add(key)
+        row = self.conn.execute(
+            "SELECT mtime_ns, size, fingerprint, outcome, old_artist, new_artist, old_title, new_title, skip_reason "
+            "FROM files WHERE path = ?",
+            (key,),
+        ).fetchone()
+        if (
+            row is None
+            or row[0] != st.st_mtime_ns
+            or row[1] != st.st_size
+            or row[2] != self.fingerprint
+        ):
+            return None
+
+        outcome = row[3]
+        if outcome == "changed":
+            return outcome, ChangeResult(
+                path=path,
+                old_artist=row[4],
+                new_artist=row[5],
+                old_title=row[6],
+                new_title=row[7],
+                changed=True,
+            )
+        if outcome == "skipped":
+            return outcome, ChangeResult(
+                path=path,
+                old_artist="",
+                new_artist="",
+                old_title="",
+                new_title="",
+                changed=False,
+                skip_reason=row[8],
+            )
+        return outcome, None
+
+    def record(self, path: Path, st: os.stat_result, result: Optional[ChangeResult]) -> None:
+        if result is None:
+            values = ("unchanged", None, None, None, None, None)
+        elif result.error:
+            self.forget(path)
+            return
+        elif result.changed:
+            values = ("changed", result.old_artist, result.new_artist, result.old_title, result.new_title, None)
+        elif result.skip_reason:
+            values = ("skipped", None, None, None, None, result.skip_reason)
+        else:
+            self.forget(path)
+            return
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (cache_key(path), st.st_mtime_ns, st.st_size, self.fingerprint, *values),
+        )
+        self._tick()
+
+    def forget(self, path: Path) -> None:
+        self.conn.execute("DELETE FROM files WHERE path = ?", (cache_key(path),))
+        self._tick()
+
+    def release_seen(self) -> None:
+        """
+        Stop remembering the paths looked up this run, for runs under a memory
+        ceiling. prune() then checks those entries on disk like the rest.
+        """
+        self.track_seen = False
+        self._seen = set()
+
+    def prune(self, root: Path) -> int:
+        """
+        Drop entries under root that weren't seen this run and no longer
+        exist on disk. Returns the number of entries removed.
+        """
+        prefix = os.path.join(cache_key(root), "")
+        gone = [
+            (p,)
+            for (p,) in self.conn.execute(
+                "SELECT path FROM files WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix),
+            )
+            if p not in self._seen and not os.path.exists(p)
+        ]
+        self.conn.executemany("DELETE FROM files WHERE path = ?", gone)
+        self.conn.commit()
+        return len(gone)
+
+    def clear(self) -> None:
+        self.conn.execute("DELETE FROM files")
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+    def _tick(self) -> None:
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
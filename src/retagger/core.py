@@ -1,15 +1,68 @@
 from __future__ import annotations
 
+import fnmatch
+import os
+import queue
 import re
-import unicodedata
-from dataclasses import dataclass
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, field, replace
+from functools import lru_cache, partial
+from itertools import groupby
+from time import perf_counter
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
 
-from mutagen.easyid3 import EasyID3
-from mutagen.id3 import ID3, ID3NoHeaderError
+from retagger.stats import RunStats, timed_iter
+
+# mutagen, concurrent.futures and unicodedata are imported where they're
+# first needed: the CLI's --help and the many files peek_artist settles
+# never touch them, and they dominate startup time otherwise.
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+    from mutagen import PaddingInfo
+    from mutagen.id3 import ID3
+
+    from retagger.aliases import ArtistIndex
+    from retagger.cache import ScanCache
+    from retagger.journal import Journal
+    from retagger.limits import ResourceLimits, Throttle
+    from retagger.progress import Progress
+    from retagger.remote import RemoteIO
 
 FEAT_IN_TITLE_RE = re.compile(r"\((?:ft\.|feat\.|featuring)\s+.+?\)", re.IGNORECASE)
+FEAT_PREFIX_RE = re.compile(r"(?:ft\.|feat\.|featuring)\s+", re.IGNORECASE)
+# Separators between names inside "(feat. A, B & C)"; the main artist also splits on "/".
+FEAT_SPLIT_RE = re.compile(r",\s*|\s+&\s+|\s+and\s+")
+MAIN_ARTIST_SPLIT_RE = re.compile(r",\s*|\s+&\s+|\s+and\s+|/")
+NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+# The same few thousand artist names and titles recur across a library, so
+# normalised forms are memoised. Bounded so a huge run can't grow it forever.
+NORM_CACHE_SIZE = 1 << 16
+
+# EasyID3-style keys for the only frames the rules look at.
+TAG_FRAMES = {"artist": "TPE1", "title": "TIT2", "albumartist": "TPE2"}
+
+
+@lru_cache(maxsize=None)
+def read_frames() -> dict:
+    # Everything else is kept as raw bytes by mutagen instead of being decoded.
+    # ID3v2.2 files use the three-letter ids, which mutagen upgrades on load.
+    from mutagen.id3 import Frames, Frames_2_2
+
+    return {
+        **{fid: Frames[fid] for fid in TAG_FRAMES.values()},
+        **{fid: Frames_2_2[fid] for fid in ("TP1", "TT2", "TP2")},
+    }
+
+
+# peek_artist reads this much of the tag up front; TPE1 is nearly always in it,
+# ahead of any cover art. The rest of the tag is only read if it isn't.
+PEEK_SIZE = 4096
+TEXT_ENCODINGS = ("latin-1", "utf-16", "utf-16-be", "utf-8")
+FRAME_ID_RE = re.compile(rb"[A-Z0-9]{4}")
 
 
 @dataclass
@@ -17,6 +70,24 @@ class RetagConfig:
     delimiter: str = "/"
     write: bool = False
     set_albumartist: bool = False
+    # Keep at least this much tag padding so later retags of the same file fit
+    # in place (0 = mutagen's default). A file with less spare padding than
+    # this is rewritten in full the first time it's saved, even if the change
+    # would have fit.
+    reserve_padding: int = 0
+    # process_library works one folder at a time and gives every track the
+    # folder's consensus main artist (see process_album).
+    group_albums: bool = False
+    # Library-wide artist names (see aliases.ArtistIndex): names are then
+    # compared by compact key and known acts are kept together as main artist.
+    artist_index: Optional[ArtistIndex] = field(default=None, repr=False, compare=False)
+    # How much of an ID3 tag to read in the first request (see peek_artist).
+    # Worth raising where every read is a network round trip.
+    read_ahead: int = PEEK_SIZE
+    # Opens tag files instead of the builtin open(); see remote.RemoteIO.
+    io: Optional[RemoteIO] = field(default=None, repr=False, compare=False)
+    # Rate, memory and priority caps for process_library (see limits.ResourceLimits).
+    limits: Optional[ResourceLimits] = field(default=None, compare=False)
 
 
 @dataclass
@@ -28,23 +99,477 @@ class ChangeResult:
     new_title: str
     changed: bool
     error: Optional[str] = None
+    skip_reason: Optional[str] = None
+    old_albumartist: str = ""
+    new_albumartist: str = ""
+    # False when old_title is the file name standing in for a missing title.
+    had_title: bool = True
+    # Filled in once the change has been saved.
+    in_place: Optional[bool] = None
+    bytes_written: int = 0
+
+
+@dataclass
+class SaveInfo:
+    in_place: bool
+    bytes_written: int
+
+
+@dataclass
+class WriteTotals:
+    patched: int = 0  # saves that overwrote the tag in place
+    rewritten: int = 0  # saves that had to rewrite the whole file
+    bytes_patched: int = 0
+    bytes_rewritten: int = 0
+
+    def add(self, in_place: Optional[bool], bytes_written: int) -> None:
+        if in_place is None:
+            return
+        if in_place:
+            self.patched += 1
+            self.bytes_patched += bytes_written
+        else:
+            self.rewritten += 1
+            self.bytes_rewritten += bytes_written
+
+
+class ID3Tags:
+    """
+    Thin EasyID3-like view (get / item assignment / save) over an ID3 object
+    that has already been parsed, so reading and writing share one parse.
+    """
+
+    def __init__(self, id3: ID3):
+        self.id3 = id3
+
+    def get(self, key: str, default=None):
+        frame = self.id3.get(TAG_FRAMES.get(key, ""))
+        if frame is None:
+            return default
+        return list(frame)
+
+    def __delitem__(self, key: str) -> None:
+        self.id3.delall(TAG_FRAMES[key])
+
+    def __setitem__(self, key: str, value: list[str]) -> None:
+        frameid = TAG_FRAMES[key]
+        frame = self.id3.get(frameid)
+        if frame is None:
+            from mutagen.id3 import Frames
+
+            self.id3.add(Frames[frameid](encoding=3, text=value))
+        else:
+            frame.encoding = 3
+            frame.text = value
+
+    def save(self, fileobj, reserve_padding: int = 0) -> SaveInfo:
+        """
+        Save through fileobj as ID3v2.3. The new tag overwrites the old one in
+        place whenever it fits in the existing padding (mutagen would otherwise
+        also shrink oversized padding, which moves the audio too). Only when
+        it doesn't fit, or leaves less than reserve_padding spare, is the whole
+        file rewritten, with max(reserve_padding, mutagen's default) padding.
+        """
+        from mutagen.id3 import ID3, BitPaddedInt, ID3NoHeaderError
+
+        if self.id3.version[:2] != (2, 3) or _has_id3v1(fileobj):
+            # Frames we didn't decode are only written back when saving in
+            # the version they were read from, and mutagen rebuilds an ID3v1
+            # tag from the decoded frames alone, so do a full parse first.
+            fileobj.seek(0)
+            try:
+                full = ID3(fileobj, v2_version=3)
+            except ID3NoHeaderError:
+                full = ID3()
+            for frameid in TAG_FRAMES.values():
+                full.delall(frameid)
+                for frame in self.id3.getall(frameid):
+                    full.add(frame)
+            self.id3 = full
+
+        in_place = True
+
+        def padding(info: PaddingInfo) -> int:
+            nonlocal in_place
+            if info.padding >= reserve_padding:
+                return info.padding
+            in_place = False
+            return max(reserve_padding, info.get_default_padding())
+
+        fileobj.seek(0)
+        self.id3.save(fileobj, v2_version=3, padding=padding)
+
+        if in_place:
+            fileobj.seek(0)
+            header = fileobj.read(10)
+            written = 10 + BitPaddedInt(header[6:10]) if header[:3] == b"ID3" else 0
+        else:
+            written = os.fstat(fileobj.fileno()).st_size
+        return SaveInfo(in_place=in_place, bytes_written=written)
+
+
+def _has_id3v1(fileobj) -> bool:
+    # The 128-byte ID3v1 block at the end of the file, which saves keep in sync.
+    size = os.fstat(fileobj.fileno()).st_size
+    return size >= 128 and _pread(fileobj, 3, size - 128) == b"TAG"
+
+
+def open_file(path: Path, mode: str, io: Optional[RemoteIO] = None):
+    return open(path, mode) if io is None else io.open(path, mode)
+
+
+def open_tag_file(path: Path, write: bool, io: Optional[RemoteIO] = None):
+    if write:
+        try:
+            return open_file(path, "rb+", io)
+        except PermissionError:
+            # Still readable; the save will report the error if there is a change.
+            pass
+    return open_file(path, "rb", io)
+
+
+def _pread(fileobj, n: int, offset: int) -> bytes:
+    # Files opened through a RemoteIO do their own (retried, delayed) preads.
+    pread = getattr(fileobj, "pread", None)
+    if pread is not None:
+        return pread(n, offset)
+    return os.pread(fileobj.fileno(), n, offset)
 
 
-def ensure_id3_header(mp3_path: Path) -> None:
+def read_tags(fileobj, head: bytes = b"") -> Optional[ID3Tags]:
+    """
+    Parse the tag from an open file, or return None if it has no ID3 tag.
+    `head` is the start of the file if it has already been read (see
+    peek_artist); only the rest is read from disk.
+    """
+    from mutagen.id3 import ID3, ID3NoHeaderError
+
+    source = PeekedFile(fileobj, head) if head else fileobj
     try:
-        ID3(mp3_path)
+        id3 = ID3(source, known_frames=read_frames(), v2_version=3)
     except ID3NoHeaderError:
-        tags = ID3()
-        tags.save(mp3_path)
+        return None
+    return ID3Tags(id3)
+
+
+def _synchsafe(b: bytes) -> Optional[int]:
+    if any(x & 0x80 for x in b):
+        return None
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+
+class CountingFile:
+    """
+    Passes a tag file through to the readers, counting the bytes they
+    actually read (peeks and parses). That's what progress reports as bytes/s,
+    so files don't need a stat just for their size.
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self.bytes_read = 0
+
+    def read(self, n: int = -1) -> bytes:
+        data = self._fileobj.read(n)
+        self.bytes_read += len(data)
+        return data
+
+    def pread(self, n: int, offset: int) -> bytes:
+        data = _pread(self._fileobj, n, offset)
+        self.bytes_read += len(data)
+        return data
+
+    def __getattr__(self, name: str):
+        return getattr(self._fileobj, name)
+
+
+class PeekedFile:
+    """
+    Read-only file object for mutagen that serves the bytes peek_artist
+    already read from memory and pread()s anything else, so a file that
+    goes on to the full parse doesn't have its tag read twice.
+    """
+
+    def __init__(self, fileobj, head: bytes):
+        self._fileobj = fileobj
+        self._head = head
+        self._pos = 0
+        self._size = os.fstat(fileobj.fileno()).st_size
+
+    def read(self, n: int = -1) -> bytes:
+        pos, head = self._pos, self._head
+        if n < 0:
+            n = max(0, self._size - pos)
+        if pos + n <= len(head):
+            data = head[pos : pos + n]
+        elif pos < len(head):
+            data = head[pos:] + _pread(self._fileobj, pos + n - len(head), len(head))
+        else:
+            data = _pread(self._fileobj, n, pos)
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += self._size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def peek_artist(fileobj, read_ahead: int = PEEK_SIZE) -> Tuple[Optional[str], bytes]:
+    """
+    Cheap look at a file's artist without mutagen: pread the ID3v2 header
+    and the start of the tag, then decode just the TPE1 frame. Returns
+    (artist, head): the first TPE1 value as mutagen would read it, and the
+    bytes read so far, for read_tags to reuse. artist is None when the file
+    needs the full parser: no ID3v2 tag (mutagen may still find ID3v1),
+    v2.2, unsynchronisation, an extended header, compressed/encrypted
+    frames, suspicious frame sizes, or no TPE1 (mutagen fills gaps from
+    ID3v1). The file position isn't moved. `read_ahead` is how much of the
+    tag to read up front.
+    """
+    data = _pread(fileobj, 10 + read_ahead, 0)
+    if len(data) < 10 or data[:3] != b"ID3":
+        return None, data
+    size = _synchsafe(data[6:10])
+    if size is None:
+        return None, data
+
+    end = 10 + size
+    # A short first read that isn't the end of the file: fetch the rest of the tag.
+    if len(data) < end and len(data) == 10 + read_ahead:
+        data += _pread(fileobj, end - len(data), len(data))
+
+    frames = peek_frames(data, (b"TPE1",))
+    return (frames or {}).get(b"TPE1"), data
+
+
+def peek_frames(data: bytes, frame_ids: Sequence[bytes]) -> Optional[dict]:
+    """
+    Decode the wanted text frames from the start of an ID3v2 tag (as read by
+    peek_artist) into {frame id: first value}. It stops as soon as it has
+    them all; a frame missing from the result is known not to be in the tag.
+    None when that can't be told without mutagen: for the same reasons
+    peek_artist gives up, or when `data` ends before the tag does.
+    """
+    if len(data) < 10 or data[:3] != b"ID3":
+        return None
+    major, flags = data[3], data[5]
+    size = _synchsafe(data[6:10])
+    if major not in (3, 4) or flags & 0xC0 or size is None:
+        return None
+
+    end = 10 + size
+    complete = len(data) >= end
+    end = min(end, len(data))
+    found: dict = {}
+    pos = 10
+    while pos + 10 <= end:
+        frame_id = data[pos : pos + 4]
+        if not FRAME_ID_RE.fullmatch(frame_id):
+            # Padding ends the frames; anything else is a frame size we
+            # misread, so let mutagen decide.
+            return found if complete and data[pos] == 0 else None
+        if major == 4:
+            frame_size = _synchsafe(data[pos + 4 : pos + 8])
+            if frame_size is None:
+                return None
+        else:
+            frame_size = int.from_bytes(data[pos + 4 : pos + 8], "big")
+        body = pos + 10
+        if body + frame_size > end:
+            return None
+        if frame_id in frame_ids and frame_id not in found:
+            format_flags = data[pos + 9]
+            # Compression, encryption, grouping; in v2.4 also unsync and data length.
+            if format_flags & (0x4F if major == 4 else 0xE0):
+                return None
+            payload = data[body : body + frame_size]
+            if not payload or payload[0] > 3:
+                return None
+            try:
+                text = payload[1:].decode(TEXT_ENCODINGS[payload[0]])
+            except UnicodeDecodeError:
+                return None
+            found[frame_id] = text.split("\0", 1)[0]
+            if len(found) == len(frame_ids):
+                return found
+        pos = body + frame_size
+    return found if complete else None
+
+
+def peek_albumartist(head: bytes) -> Optional[str]:
+    """
+    The albumartist (TPE2) in a head peek_artist read: "" when the tag has
+    none, None when the full parser is needed to tell.
+    """
+    frames = peek_frames(head, (b"TPE2",))
+    return None if frames is None else frames.get(b"TPE2", "")
 
 
+class MappedTags:
+    """
+    The same view as ID3Tags over any other mutagen file whose tags are a
+    plain key -> list-of-strings mapping (Vorbis comments, MP4 atoms).
+    `keys` maps our artist/title/albumartist names to the format's own.
+    """
+
+    def __init__(self, audio, keys: Mapping[str, str]):
+        self.audio = audio
+        self.keys = keys
+
+    @classmethod
+    def load(cls, audio, keys: Mapping[str, str]) -> Optional[MappedTags]:
+        return None if audio.tags is None else cls(audio, keys)
+
+    def get(self, key: str, default=None):
+        values = self.audio.tags.get(self.keys.get(key, ""))
+        if not values:
+            return default
+        return [str(v) for v in values]
+
+    def __delitem__(self, key: str) -> None:
+        name = self.keys[key]
+        if name in self.audio.tags:
+            del self.audio.tags[name]
+
+    def __setitem__(self, key: str, value: list[str]) -> None:
+        self.audio.tags[self.keys[key]] = value
+
+    def save(self, fileobj, reserve_padding: int = 0) -> SaveInfo:
+        """Save through fileobj, keeping the existing padding as ID3Tags.save does."""
+        in_place = True
+        audio_size = None
+
+        def padding(info: PaddingInfo) -> int:
+            nonlocal in_place, audio_size
+            audio_size = info.size
+            if info.padding >= reserve_padding:
+                return info.padding
+            in_place = False
+            return max(reserve_padding, info.get_default_padding())
+
+        fileobj.seek(0)
+        self.audio.save(fileobj, padding=padding)
+
+        size = os.fstat(fileobj.fileno()).st_size
+        written = size - audio_size if in_place and audio_size is not None else size
+        return SaveInfo(in_place=in_place, bytes_written=written)
+
+
+Tags = Union[ID3Tags, MappedTags]
+
+VORBIS_KEYS = {"artist": "artist", "title": "title", "albumartist": "albumartist"}
+MP4_KEYS = {"artist": "\xa9ART", "title": "\xa9nam", "albumartist": "aART"}
+
+
+def _read_flac(fileobj, head: bytes = b"") -> Optional[MappedTags]:
+    from mutagen.flac import FLAC
+
+    return MappedTags.load(FLAC(fileobj), VORBIS_KEYS)
+
+
+def _read_ogg_vorbis(fileobj, head: bytes = b"") -> Optional[MappedTags]:
+    from mutagen.oggvorbis import OggVorbis
+
+    return MappedTags.load(OggVorbis(fileobj), VORBIS_KEYS)
+
+
+def _read_ogg_opus(fileobj, head: bytes = b"") -> Optional[MappedTags]:
+    from mutagen.oggopus import OggOpus
+
+    return MappedTags.load(OggOpus(fileobj), VORBIS_KEYS)
+
+
+def _read_mp4(fileobj, head: bytes = b"") -> Optional[MappedTags]:
+    from mutagen.mp4 import MP4
+
+    return MappedTags.load(MP4(fileobj), MP4_KEYS)
+
+
+@dataclass(frozen=True)
+class TagBackend:
+    """
+    One tag format. read(fileobj, head) returns a tag view (get / item
+    assignment / save, see ID3Tags) or None if the file has no tag, which is
+    reported as `no_tags`. peek(fileobj, read_ahead), if set, is a cheap
+    (artist, head) look at the file in the style of peek_artist, so files
+    that can't change never reach read(). peek_albumartist(head), if set,
+    finds the albumartist in that head the way peek_albumartist does.
+    """
+
+    name: str
+    extensions: Tuple[str, ...]
+    read: Callable[..., Optional[Tags]]
+    peek: Optional[Callable[..., Tuple[Optional[str], bytes]]] = None
+    no_tags: str = "no tags"
+    peek_albumartist: Optional[Callable[[bytes], Optional[str]]] = None
+
+
+# Lowercase extension -> backend. Files with an extension nobody registered
+# (only ever seen when passed in directly) are read as ID3, as they always were.
+BACKENDS: dict[str, TagBackend] = {}
+
+
+def register_backend(backend: TagBackend) -> None:
+    for ext in backend.extensions:
+        BACKENDS[ext.lower()] = backend
+
+
+ID3_BACKEND = TagBackend("mp3", (".mp3",), read_tags, peek_artist, "no ID3 tag", peek_albumartist)
+
+for _backend in (
+    ID3_BACKEND,
+    TagBackend("flac", (".flac",), _read_flac, no_tags="no Vorbis comment"),
+    TagBackend("ogg", (".ogg", ".oga"), _read_ogg_vorbis, no_tags="no Vorbis comment"),
+    TagBackend("opus", (".opus",), _read_ogg_opus, no_tags="no Vorbis comment"),
+    TagBackend("m4a", (".m4a", ".mp4"), _read_mp4, no_tags="no MP4 tags"),
+):
+    register_backend(_backend)
+
+
+def backend_for(path: Path) -> TagBackend:
+    return BACKENDS.get(os.path.splitext(path)[1].lower(), ID3_BACKEND)
+
+
+def backend_names() -> List[str]:
+    return list(dict.fromkeys(b.name for b in BACKENDS.values()))
+
+
+def audio_extensions(formats: Optional[Iterable[str]] = None) -> Tuple[str, ...]:
+    """Registered extensions, optionally only those of the named backends."""
+    if formats is None:
+        return tuple(BACKENDS)
+    wanted = set(formats)
+    return tuple(ext for ext, b in BACKENDS.items() if b.name in wanted)
+
+
+@lru_cache(maxsize=NORM_CACHE_SIZE)
 def norm(s: str) -> str:
     # Lowercase, remove accents, collapse punctuation to spaces, collapse whitespace.
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    if not s.isascii():
+        import unicodedata
+
+        s = unicodedata.normalize("NFKD", s)
+        s = "".join(ch for ch in s if not unicodedata.combining(ch))
     s = s.casefold()
-    s = re.sub(r"[^a-z0-9]+", " ", s)
-    return " ".join(s.split())
+    return " ".join(NON_ALNUM_RE.sub(" ", s).split())
+
+
+@lru_cache(maxsize=NORM_CACHE_SIZE)
+def _remix_window(title: str) -> Optional[str]:
+    # Up to 6 normalised words before "remix", or None if the title has no "remix".
+    words = norm(title).split()
+    try:
+        remix_i = words.index("remix")
+    except ValueError:
+        return None
+    return " ".join(words[max(0, remix_i - 6) : remix_i])
 
 
 def has_feat_in_title(title: str) -> bool:
@@ -60,20 +585,13 @@ def looks_like_remixer_in_title(title: str, artist_name: str) -> bool:
       - "Tiesto's Club Life Remix"
       - "(Skrillex & Zedd Remix)"
     """
-    t = norm(title)
     a = norm(artist_name)
     if not a:
         return False
 
     # Find "remix" and see if artist name occurs shortly before it (within ~6 words).
-    words = t.split()
-    try:
-        remix_i = words.index("remix")
-    except ValueError:
-        return False
-
-    window = " ".join(words[max(0, remix_i - 6) : remix_i])  # up to 6 words before "remix"
-    return a in window
+    window = _remix_window(title)
+    return window is not None and a in window
 
 
 def clean_title_remixer_features(title: str) -> str:
@@ -91,7 +609,7 @@ def clean_title_remixer_features(title: str) -> str:
     content = full_match[1:-1]
     
     # Remove the prefix (ft., feat., featuring)
-    prefix_match = re.match(r"(?:ft\.|feat\.|featuring)\s+", content, re.IGNORECASE)
+    prefix_match = FEAT_PREFIX_RE.match(content)
     if not prefix_match:
         # Should match given the regex, but safety first
         return title
@@ -101,7 +619,7 @@ def clean_title_remixer_features(title: str) -> str:
     
     # Split artists
     # delimiters: comma, &, and
-    raw_artists = re.split(r",\s*|\s+&\s+|\s+and\s+", artists_str)
+    raw_artists = FEAT_SPLIT_RE.split(artists_str)
     raw_artists = [a.strip() for a in raw_artists if a.strip()]
     
     # Filter out remixers
@@ -130,7 +648,7 @@ def clean_title_remixer_features(title: str) -> str:
     return new_title
 
 
-def pick_main_artist(tags: EasyID3, artists: list[str]) -> str:
+def pick_main_artist(tags: Tags, artists: list[str]) -> str:
     # Prefer albumartist/band when present (common for albums where Artist includes remixers, etc.)
     for key in ("albumartist", "band"):
         v = (tags.get(key, [""])[0] or "").strip()
@@ -139,11 +657,11 @@ def pick_main_artist(tags: EasyID3, artists: list[str]) -> str:
     return artists[0] if artists else ""
 
 
-def unique_keep_order(items: list[str]) -> list[str]:
+def unique_keep_order(items: list[str], key: Callable[[str], str] = norm) -> list[str]:
     seen = set()
     out = []
     for x in items:
-        k = norm(x)
+        k = key(x)
         if not k or k in seen:
             continue
         seen.add(k)
@@ -151,35 +669,284 @@ def unique_keep_order(items: list[str]) -> list[str]:
     return out
 
 
-def detect_features(artists: list[str], main_artist: str) -> list[str]:
+def detect_features(
+    artists: list[str], main_artist: str, index: Optional[ArtistIndex] = None
+) -> list[str]:
     # Featured = everyone except main
     # We also filter out any individual artist that is part of the main artist string
     # e.g. if Main is "JAY-Z, Kanye West", then "JAY-Z" and "Kanye West" are NOT features.
-    
-    main_artist_parts = [norm(p.strip()) for p in re.split(r",\s*|\s+&\s+|\s+and\s+|/", main_artist) if p.strip()]
+    if index is not None:
+        main_parts = index.parts(main_artist)
+        featured = [a for a in artists if index.key(a) not in main_parts]
+        return unique_keep_order(featured, index.key)
+
+    main_norm = norm(main_artist)
+    main_artist_parts = {norm(p.strip()) for p in MAIN_ARTIST_SPLIT_RE.split(main_artist) if p.strip()}
     
     featured = []
     for a in artists:
         norm_a = norm(a)
-        if norm_a != norm(main_artist) and norm_a not in main_artist_parts:
+        if norm_a != main_norm and norm_a not in main_artist_parts:
             featured.append(a)
             
     return unique_keep_order(featured)
 
 
-def get_mp3_files(root: Path, recursive: bool = True) -> List[Path]:
+def _is_excluded(name: str, rel: str, exclude: Sequence[str]) -> bool:
+    return any(fnmatch.fnmatch(name, pat) or fnmatch.fnmatch(rel, pat) for pat in exclude)
+
+
+def iter_audio_files(
+    root: Path,
+    recursive: bool = True,
+    *,
+    max_depth: Optional[int] = None,
+    exclude: Sequence[str] = (),
+    sort: bool = False,
+    extensions: Optional[Sequence[str]] = None,
+    files_first: bool = False,
+    inode_order: bool = False,
+) -> Iterator[Path]:
+    """
+    Walk root with os.scandir, yielding files with one of `extensions` (any
+    case; default: every format with a registered backend) as they're found.
+
+    max_depth limits how many directory levels below root are entered (0 means
+    root only, same as recursive=False). `exclude` globs are matched against
+    both the entry name and its path relative to root; an excluded directory
+    isn't descended into. With sort=True each directory's entries are visited
+    in name order, which gives the same order as sorting the full paths while
+    still streaming. files_first=True yields all of a directory's files before
+    entering any of its subdirectories, so each folder's files come out
+    together (for album grouping); sorting is then per directory only.
+    inode_order=True visits each directory's entries by inode number instead
+    (known from readdir, so it costs no stat calls), which tends to follow
+    the on-disk or server-side layout. Directory symlinks aren't followed and
+    unreadable directories are skipped.
+    """
+    if not recursive:
+        max_depth = 0
+    suffixes = tuple(ext.lower() for ext in (audio_extensions() if extensions is None else extensions))
+
+    def entries(path: str) -> Iterator[os.DirEntry]:
+        try:
+            it = os.scandir(path)
+        except OSError:
+            return iter(())
+        if not (sort or inode_order):
+            return it
+        with it:
+            if inode_order:
+                return iter(sorted(it, key=lambda e: e.inode()))
+            return iter(sorted(it, key=lambda e: e.name))
+
+    def deferred(path: str) -> Iterator[os.DirEntry]:
+        # Opened only once it's reached, so waiting subdirectories hold no fds.
+        yield from entries(path)
+
+    root_str = os.fspath(root)
+    stack: list = [(entries(root_str), 0, [])]
+    while stack:
+        it, depth, subdirs = stack[-1]
+        entry = next(it, None)
+        if entry is None:
+            stack.pop()
+            for path in reversed(subdirs):
+                stack.append((deferred(path), depth + 1, []))
+            continue
+
+        if exclude:
+            rel = os.path.relpath(entry.path, root_str)
+            if _is_excluded(entry.name, rel, exclude):
+                continue
+
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if max_depth is None or depth < max_depth:
+                    if files_first:
+                        subdirs.append(entry.path)
+                    else:
+                        stack.append((entries(entry.path), depth + 1, []))
+            elif entry.name.lower().endswith(suffixes) and entry.is_file():
+                yield Path(entry.path)
+        except OSError:
+            continue
+
+
+def iter_mp3_files(root: Path, recursive: bool = True, **kwargs) -> Iterator[Path]:
+    return iter_audio_files(root, recursive, extensions=ID3_BACKEND.extensions, **kwargs)
+
+
+def get_audio_files(
+    root: Path, recursive: bool = True, extensions: Optional[Sequence[str]] = None
+) -> List[Path]:
     if not root.exists():
         return []
-    if recursive:
-        return sorted(root.rglob("*.mp3"))
-    return sorted(root.glob("*.mp3"))
+    return sorted(iter_audio_files(root, recursive, extensions=extensions))
+
+
+def get_mp3_files(root: Path, recursive: bool = True) -> List[Path]:
+    return get_audio_files(root, recursive, ID3_BACKEND.extensions)
+
+
+def read_path_list(stream, chunk_size: int = 1 << 16) -> Iterator[Path]:
+    """
+    Stream paths from a binary list such as stdin: NUL-separated (find
+    -print0) if the first separator seen is a NUL, otherwise one per line.
+    Paths are yielded as soon as they arrive, so a slow producer isn't
+    waited on, and the list is never held in memory.
+    """
+    read = getattr(stream, "read1", stream.read)
+    sep = None
+    buf = b""
+    while True:
+        chunk = read(chunk_size)
+        if not chunk:
+            break
+        buf += chunk
+        if sep is None:
+            nul, nl = buf.find(b"\0"), buf.find(b"\n")
+            if nul < 0 and nl < 0:
+                continue
+            sep = b"\0" if nl < 0 or 0 <= nul < nl else b"\n"
+        *items, buf = buf.split(sep)
+        for item in items:
+            if sep == b"\n":
+                item = item.rstrip(b"\r")
+            if item:
+                yield Path(os.fsdecode(item))
+    if sep == b"\n":
+        buf = buf.rstrip(b"\r")
+    if buf:
+        yield Path(os.fsdecode(buf))
+
+
+def error_result(path: Path, error: Exception) -> ChangeResult:
+    return ChangeResult(
+        path=path,
+        old_artist="",
+        new_artist="",
+        old_title="",
+        new_title="",
+        changed=False,
+        error=str(error),
+    )
+
+
+def process_file(
+    path: Path,
+    config: RetagConfig,
+    timings: Optional[dict] = None,
+    journal: Optional["Journal"] = None,
+    reads: Optional[List[int]] = None,
+) -> Optional[ChangeResult]:
+    """
+    Classify one file and, in write mode, save the change. If `timings` is
+    given it's filled with seconds spent per stage (open/parse/analyse/write).
+    With a `journal`, the old and new tags are logged before the save and the
+    save is marked done after it. With `reads`, the number of bytes read to
+    classify the file is appended to it.
+    """
+    start = perf_counter()
+    try:
+        fh = open_tag_file(path, config.write, config.io)
+    except Exception as e:
+        return error_result(path, e)
+    if timings is not None:
+        timings["open"] = perf_counter() - start
+
+    with fh:
+        result, tags = _analyse_counted(path, fh, config, timings, reads)
+        if tags is not None:
+            start = perf_counter()
+            if journal is not None:
+                journal.begin(result)
+            saved = tags.save(fh, config.reserve_padding)
+            if journal is not None:
+                journal.commit(result)
+            result.in_place = saved.in_place
+            result.bytes_written = saved.bytes_written
+            if timings is not None:
+                timings["write"] = perf_counter() - start
+    return result
+
+
+def analyse_file(
+    path: Path,
+    config: RetagConfig,
+    timings: Optional[dict] = None,
+    reads: Optional[List[int]] = None,
+) -> Tuple[Optional[ChangeResult], Optional[Tags]]:
+    """
+    Read-only half of process_file: classify the file and, in write mode,
+    return the updated tags for a WriteQueue to save later (None when there's
+    nothing to write). The file is only ever opened for reading here.
+    """
+    start = perf_counter()
+    try:
+        fh = open_file(path, "rb", config.io)
+    except Exception as e:
+        return error_result(path, e), None
+    if timings is not None:
+        timings["open"] = perf_counter() - start
+
+    with fh:
+        return _analyse_counted(path, fh, config, timings, reads)
+
+
+def _analyse_counted(
+    path: Path, fh, config: RetagConfig, timings: Optional[dict], reads: Optional[List[int]]
+) -> Tuple[Optional[ChangeResult], Optional[Tags]]:
+    if reads is None:
+        return _analyse(path, fh, config, timings)
+    counting = CountingFile(fh)
+    try:
+        return _analyse(path, counting, config, timings)
+    finally:
+        reads.append(counting.bytes_read)
 
 
-def process_file(path: Path, config: RetagConfig) -> Optional[ChangeResult]:
+def _load(
+    path: Path,
+    fh,
+    config: RetagConfig,
+    timings: Optional[dict] = None,
+    albumartist: bool = False,
+) -> Tuple[Optional[ChangeResult], Optional[Tags], Optional[str]]:
+    """
+    Read side of _analyse: (result, tags, artist). Exactly one is set: an
+    error/skip result, the parsed tags, or the artist when the peek already
+    showed it's a single artist with nothing to change.
+
+    With albumartist=True such a file's albumartist is returned in place of
+    its artist when it has one. If the peek can't tell, the file is parsed.
+    """
+    backend = backend_for(path)
+    start = perf_counter()
     try:
-        ensure_id3_header(path)
-        tags = EasyID3(path)
+        if backend.peek is not None:
+            artist, head = backend.peek(fh, config.read_ahead)
+        else:
+            artist, head = None, b""
+        settled = artist is not None and config.delimiter not in artist
+        if settled and albumartist:
+            found = backend.peek_albumartist(head) if backend.peek_albumartist else None
+            settled = found is not None
+            if found and found.strip():
+                artist = found
+        if settled:
+            # Most of a library: a single artist, so nothing for mutagen to do.
+            if timings is not None:
+                timings["parse"] = perf_counter() - start
+            return None, None, artist
+        tags = backend.read(fh, head)
     except Exception as e:
+        return error_result(path, e), None, None
+    if timings is not None:
+        timings["parse"] = perf_counter() - start
+
+    if tags is None:
+        # Nothing to retag without an artist, and no reason to touch the file.
         return ChangeResult(
             path=path,
             old_artist="",
@@ -187,23 +954,97 @@ def process_file(path: Path, config: RetagConfig) -> Optional[ChangeResult]:
             old_title="",
             new_title="",
             changed=False,
-            error=str(e),
-        )
+            skip_reason=backend.no_tags,
+        ), None, None
+    return None, tags, None
+
+
+def _analyse(
+    path: Path, fh, config: RetagConfig, timings: Optional[dict] = None
+) -> Tuple[Optional[ChangeResult], Optional[Tags]]:
+    result, tags, _ = _load(path, fh, config, timings)
+    if tags is None:
+        return result, None
+
+    start = perf_counter()
+    result = _retag(path, tags, config)
+    if timings is not None:
+        timings["analyse"] = perf_counter() - start
+    if result is None or not config.write:
+        return result, None
+    return result, tags
 
+
+def _retag(
+    path: Path, tags: Tags, config: RetagConfig, main_artist: Optional[str] = None
+) -> Optional[ChangeResult]:
     artist_raw = (tags.get("artist", [""])[0] or "").strip()
     if not artist_raw or config.delimiter not in artist_raw:
         return None
 
-    artists = [s.strip() for s in artist_raw.split(config.delimiter) if s.strip()]
-    if len(artists) < 2:
+    had_title = tags.get("title") is not None
+    title = (tags.get("title", [path.stem])[0] or path.stem).strip()
+    albumartist = (tags.get("albumartist", [""])[0] or "").strip()
+
+    decision = retag_fields(
+        artist_raw, title, albumartist, config.delimiter, main_artist, config.artist_index
+    )
+    if decision is None:
         return None
+    new_artist, new_title = decision
+    new_albumartist = new_artist if config.set_albumartist else albumartist
 
-    title = (tags.get("title", [path.stem])[0] or path.stem).strip()
+    if config.write:
+        tags["artist"] = [new_artist]
+        tags["title"] = [new_title]
+        if config.set_albumartist:
+            tags["albumartist"] = [new_artist]
+
+    return ChangeResult(
+        path=path,
+        old_artist=artist_raw,
+        new_artist=new_artist,
+        old_title=title,
+        new_title=new_title,
+        changed=True,
+        old_albumartist=albumartist,
+        new_albumartist=new_albumartist,
+        had_title=had_title,
+    )
+
+
+def retag_fields(
+    artist: str,
+    title: str,
+    albumartist: str = "",
+    delimiter: str = "/",
+    main_artist: Optional[str] = None,
+    index: Optional[ArtistIndex] = None,
+) -> Optional[Tuple[str, str]]:
+    """
+    The retagging rules on plain (already stripped) strings: the new
+    (artist, title), or None if they'd stay as they are. `main_artist` (an
+    album's consensus, see process_album) wins over albumartist, but only
+    if it's one of this track's artists. With an `index`, a known act at
+    the head of the artist list is the next choice after albumartist.
+    """
+    if not artist or delimiter not in artist:
+        return None
 
-    main_artist = pick_main_artist(tags, artists).strip()
+    artists = [s.strip() for s in artist.split(delimiter) if s.strip()]
+    if len(artists) < 2:
+        return None
+
+    key = artist_key if index is None else index.key
+    if main_artist and key(main_artist) not in {key(a) for a in artists}:
+        main_artist = None
+    # Prefer albumartist when present (common for albums where Artist includes remixers, etc.)
+    if not main_artist and not albumartist and index is not None:
+        main_artist = index.act_for(artists)
+    main_artist = (main_artist or albumartist or artists[0]).strip()
     if not main_artist:
         return None
-    featured = detect_features(artists, main_artist)
+    featured = detect_features(artists, main_artist, index)
 
     # Drop featured artists who are credited as remixers in the title
     featured = [a for a in featured if not looks_like_remixer_in_title(title, a)]
@@ -218,22 +1059,556 @@ def process_file(path: Path, config: RetagConfig) -> Optional[ChangeResult]:
         new_title = clean_title_remixer_features(new_title)
 
     # If no featured left after filtering, still normalize Artist to main.
-    would_change = (new_artist != artist_raw) or (new_title != title)
-    if not would_change:
+    if new_artist == artist and new_title == title:
         return None
+    return new_artist, new_title
 
-    if config.write:
-        tags["artist"] = [new_artist]
-        tags["title"] = [new_title]
-        if config.set_albumartist:
-            tags["albumartist"] = [new_artist]
-        tags.save(path, v2_version=3)
 
-    return ChangeResult(
-        path=path,
-        old_artist=artist_raw,
-        new_artist=new_artist,
-        old_title=title,
-        new_title=new_title,
-        changed=True,
-    )
+@dataclass
+class BatchDecisions:
+    """Per-row output of analyse_batch, one list entry per input row."""
+
+    changed: List[bool]
+    new_artist: List[str]
+    new_title: List[str]
+    new_albumartist: List[str]
+    # Distinct (artist, title, albumartist) rows the rules actually ran on.
+    unique: int
+
+
+def analyse_batch(
+    records: Mapping[str, Sequence[str]], config: Optional[RetagConfig] = None
+) -> BatchDecisions:
+    """
+    Run the retagging rules over a table of tags without touching any files.
+
+    records holds equal-length "artist" and "title" columns and, optionally,
+    "albumartist". Identical rows (common on compilations and album rips) are
+    only evaluated once. Rows that don't change keep their input values
+    (stripped) in the new_* columns; new_albumartist only differs when
+    config.set_albumartist is on.
+    """
+    config = config or RetagConfig()
+    artists = records["artist"]
+    titles = records["title"]
+    albumartists = records.get("albumartist")
+    if albumartists is None:
+        albumartists = [""] * len(artists)
+    if not len(artists) == len(titles) == len(albumartists):
+        raise ValueError("artist, title and albumartist columns must be the same length")
+
+    out = BatchDecisions(changed=[], new_artist=[], new_title=[], new_albumartist=[], unique=0)
+    memo: dict[Tuple[str, str, str], Tuple[bool, str, str, str]] = {}
+    for row in zip(artists, titles, albumartists):
+        decided = memo.get(row)
+        if decided is None:
+            artist, title, albumartist = ((v or "").strip() for v in row)
+            decision = retag_fields(
+                artist, title, albumartist, config.delimiter, index=config.artist_index
+            )
+            if decision is None:
+                decided = (False, artist, title, albumartist)
+            else:
+                new_artist, new_title = decision
+                decided = (
+                    True,
+                    new_artist,
+                    new_title,
+                    new_artist if config.set_albumartist else albumartist,
+                )
+            memo[row] = decided
+        out.changed.append(decided[0])
+        out.new_artist.append(decided[1])
+        out.new_title.append(decided[2])
+        out.new_albumartist.append(decided[3])
+    out.unique = len(memo)
+    return out
+
+
+class WriteQueue:
+    """
+    Write-behind stage for write mode. Analysed files are handed over with
+    put() and saved by a small pool of writer threads, so slow disk writes
+    don't stall reading and classification. The queue is bounded: put()
+    blocks once `maxsize` saves are waiting, which caps how many parsed tags
+    are held in memory.
+
+    close(drain=True) waits for every queued save; close(drain=False) drops
+    saves that haven't started yet (those files are left untouched) and
+    records them in `discarded`. Saves that raised end up in `failures`;
+    `totals` counts what the successful ones wrote. With a `journal`, every
+    save is logged there as in process_file; with `io`, files are opened
+    through it.
+    """
+
+    def __init__(
+        self,
+        writers: int = 1,
+        maxsize: Optional[int] = None,
+        stats: Optional[RunStats] = None,
+        journal: Optional["Journal"] = None,
+        io: Optional[RemoteIO] = None,
+    ):
+        if writers < 1:
+            raise ValueError("writers must be >= 1")
+        self._queue: queue.Queue = queue.Queue(maxsize or writers * 8)
+        self._lock = threading.Lock()
+        self.written = 0
+        self.totals = WriteTotals()
+        self.stats = stats
+        self.journal = journal
+        self.io = io
+        self.failures: list[ChangeResult] = []
+        self.discarded: list[ChangeResult] = []
+        self._threads = [
+            threading.Thread(target=self._run, name=f"retag-writer-{i}", daemon=True)
+            for i in range(writers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def put(self, result: ChangeResult, tags: Tags, reserve_padding: int = 0) -> None:
+        self._queue.put((result, tags, reserve_padding))
+
+    def close(self, drain: bool = True) -> None:
+        if not drain:
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    self.discarded.append(item[0])
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            result, tags, reserve_padding = item
+            start = perf_counter()
+            try:
+                with open_file(result.path, "rb+", self.io) as fh:
+                    if self.journal is not None:
+                        self.journal.begin(result)
+                    saved = tags.save(fh, reserve_padding)
+                if self.journal is not None:
+                    self.journal.commit(result)
+            except Exception as e:
+                with self._lock:
+                    self.failures.append(replace(result, error=str(e)))
+            else:
+                result.in_place = saved.in_place
+                result.bytes_written = saved.bytes_written
+                with self._lock:
+                    self.written += 1
+                    self.totals.add(saved.in_place, saved.bytes_written)
+                if self.stats is not None:
+                    self.stats.add_stage("write", perf_counter() - start)
+
+
+def _process_one(
+    path: Path,
+    config: RetagConfig,
+    timings: Optional[dict] = None,
+    journal: Optional["Journal"] = None,
+    reads: Optional[List[int]] = None,
+) -> Optional[ChangeResult]:
+    # Worker entry point: a failed save shouldn't take the whole run down with it.
+    try:
+        return process_file(path, config, timings, journal, reads)
+    except Exception as e:
+        return error_result(path, e)
+
+
+# Worker results: (result, tags left to save or None, per-stage timings or None,
+# bytes read to classify the file; only counted when asked for)
+WorkerResult = Tuple[Optional[ChangeResult], Optional[Tags], Optional[dict], int]
+
+
+def _process_one_deferred(
+    path: Path, config: RetagConfig, timed: bool, counted: bool = False
+) -> WorkerResult:
+    # Same as _process_one, but any save is handed back for a WriteQueue.
+    timings = {} if timed else None
+    reads: Optional[List[int]] = [] if counted else None
+    try:
+        result, tags = analyse_file(path, config, timings, reads)
+    except Exception as e:
+        result, tags = error_result(path, e), None
+    return result, tags, timings, sum(reads or ())
+
+
+def _process_one_inline(
+    path: Path,
+    config: RetagConfig,
+    timed: bool,
+    counted: bool = False,
+    journal: Optional["Journal"] = None,
+) -> WorkerResult:
+    timings = {} if timed else None
+    reads: Optional[List[int]] = [] if counted else None
+    result = _process_one(path, config, timings, journal, reads)
+    return result, None, timings, sum(reads or ())
+
+
+def _run_each(
+    paths: List[Path], config: RetagConfig, timed: bool, counted: bool, run_one
+) -> List[WorkerResult]:
+    return [run_one(p, config, timed, counted) for p in paths]
+
+
+def artist_key(name: str) -> str:
+    # norm() drops non-Latin scripts entirely; fall back to a plain casefold.
+    return norm(name) or name.strip().casefold()
+
+
+def album_groups(paths: Iterable[Path]) -> Iterator[List[Path]]:
+    """Runs of consecutive paths in the same folder (see iter_audio_files' files_first)."""
+    for _, group in groupby(paths, key=lambda p: p.parent):
+        yield list(group)
+
+
+def process_album(
+    paths: Sequence[Path],
+    config: RetagConfig,
+    timed: bool = False,
+    counted: bool = False,
+    journal: Optional["Journal"] = None,
+    deferred: bool = False,
+) -> List[WorkerResult]:
+    """
+    Process one album folder's files together, returning a WorkerResult per
+    path. Every file is read first and votes for a main artist (its
+    albumartist, else its first listed artist; single-artist tracks have
+    their albumartist read from the peek, so they still skip the full
+    parse). If a strict majority agree, that's the album's consensus and
+    every track that lists it gets it as main artist, so an album whose
+    albumartist is missing on some tracks still comes out consistent. Without a majority (compilations) each track
+    is decided on its own, as in process_file. The changed files are then
+    saved back to back; with deferred=True the tags are handed back for a
+    WriteQueue instead.
+    """
+    key = artist_key if config.artist_index is None else config.artist_index.key
+    loaded = []
+    votes: Counter = Counter()
+    spelling: dict[str, str] = {}
+    for p in paths:
+        timings = {} if timed else None
+        nbytes = 0
+        start = perf_counter()
+        try:
+            with open_file(p, "rb", config.io) as fh:
+                if timings is not None:
+                    timings["open"] = perf_counter() - start
+                source = CountingFile(fh) if counted else fh
+                try:
+                    result, tags, artist = _load(p, source, config, timings, albumartist=True)
+                finally:
+                    if counted:
+                        nbytes = source.bytes_read
+        except Exception as e:
+            result, tags, artist = error_result(p, e), None, None
+
+        vote = artist or ""
+        if tags is not None:
+            vote = (tags.get("albumartist", [""])[0] or "").strip()
+            if not vote:
+                vote = (tags.get("artist", [""])[0] or "").split(config.delimiter)[0]
+        vote = vote.strip()
+        if vote:
+            votes[key(vote)] += 1
+            spelling.setdefault(key(vote), vote)
+        loaded.append((p, result, tags, timings, nbytes))
+
+    consensus = None
+    if votes:
+        top, n = votes.most_common(1)[0]
+        if n * 2 > sum(votes.values()):
+            consensus = spelling[top]
+
+    out: List[WorkerResult] = []
+    for p, result, tags, timings, nbytes in loaded:
+        if tags is not None:
+            start = perf_counter()
+            result = _retag(p, tags, config, consensus)
+            if timings is not None:
+                timings["analyse"] = perf_counter() - start
+            if result is None or not config.write:
+                tags = None
+        if tags is not None and not deferred:
+            start = perf_counter()
+            try:
+                with open_file(p, "rb+", config.io) as fh:
+                    if journal is not None:
+                        journal.begin(result)
+                    saved = tags.save(fh, config.reserve_padding)
+                if journal is not None:
+                    journal.commit(result)
+            except Exception as e:
+                result = error_result(p, e)
+            else:
+                result.in_place = saved.in_place
+                result.bytes_written = saved.bytes_written
+            if timings is not None:
+                timings["write"] = perf_counter() - start
+            tags = None
+        out.append((result, tags, timings, nbytes))
+    return out
+
+
+def _make_executor(executor: str, workers: int) -> Executor:
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    if executor == "thread":
+        return ThreadPoolExecutor(max_workers=workers)
+    if executor == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+    raise ValueError(f"unknown executor: {executor!r} (expected 'thread' or 'process')")
+
+
+def process_library(
+    paths: Iterable[Path],
+    config: RetagConfig,
+    *,
+    workers: int = 1,
+    executor: str = "thread",
+    ordered: bool = True,
+    cancel: Optional[threading.Event] = None,
+    cache: Optional["ScanCache"] = None,
+    write_queue: Optional[WriteQueue] = None,
+    stats: Optional[RunStats] = None,
+    journal: Optional["Journal"] = None,
+    progress: Optional["Progress"] = None,
+    throttle: Optional["Throttle"] = None,
+) -> Iterator[Tuple[Path, Optional[ChangeResult]]]:
+    """
+    Run process_file over paths, spread across `workers` threads or processes.
+
+    Yields (path, result) pairs, one per input path. With ordered=True they come
+    out in input order; otherwise as soon as each file finishes. Only a bounded
+    window of files is in flight at once, so paths can be a lazy iterable.
+    Setting `cancel` stops submitting new work; files already running finish
+    (and are yielded), anything still queued is dropped.
+
+    With a `cache`, files whose stat signature and config still match a cached
+    outcome are answered from the cache without being opened.
+
+    With a `write_queue` (write mode, thread executor only), workers only read
+    and classify; saves are queued for its writer threads. A yielded change has
+    then been scheduled, not necessarily written: close the queue afterwards
+    and check its `failures`.
+
+    With `stats`, time spent walking `paths` and in each per-file stage is
+    recorded there (files answered from the cache aren't timed).
+
+    With a `journal` (thread executor only), inline saves are logged there;
+    a write_queue logs to its own journal.
+
+    With `progress`, every yielded file is counted there, with the bytes read
+    to classify it (0 for cache hits). Nothing is stat'ed for it.
+
+    With config.group_albums, consecutive paths in the same folder are handed
+    to process_album together (walk with files_first=True so each folder comes
+    out in one run); workers then take a folder at a time.
+
+    With config.limits (or a `throttle` built from them, to read its counters
+    afterwards), files are opened no faster than the rate caps allow, and past
+    the memory ceiling the memos and the cache's seen paths are dropped and
+    only one unit per worker stays in flight. Results are never collected
+    here, so a caller that streams them keeps memory flat.
+    """
+    if workers < 1:
+        raise ValueError("workers must be >= 1")
+    if write_queue is not None and workers > 1 and executor != "thread":
+        raise ValueError("write_queue needs the thread executor")
+    if journal is not None and workers > 1 and executor != "thread":
+        raise ValueError("journal needs the thread executor")
+    if config.artist_index is not None and workers > 1 and executor != "thread":
+        # It would be pickled along with the config for every single file.
+        raise ValueError("artist_index needs the thread executor")
+    if config.io is not None and workers > 1 and executor != "thread":
+        raise ValueError("io needs the thread executor")
+    if throttle is None and config.limits:
+        from retagger.limits import Throttle
+
+        throttle = Throttle(config.limits, cancel)
+
+    if config.group_albums:
+        units: Iterable[List[Path]] = album_groups(timed_iter(paths, stats))
+        work = partial(
+            process_album, journal=journal, deferred=write_queue is not None and config.write
+        )
+    else:
+        units = ([p] for p in timed_iter(paths, stats))
+        run_one = _process_one_inline
+        if write_queue is not None and config.write:
+            run_one = _process_one_deferred
+        elif journal is not None:
+            run_one = partial(_process_one_inline, journal=journal)
+        work = partial(_run_each, run_one=run_one)
+
+    def hand_off(result: Optional[ChangeResult], tags: Optional[Tags]) -> None:
+        if tags is not None and write_queue is not None:
+            # Blocks while the writers are behind, which throttles the readers.
+            write_queue.put(result, tags, config.reserve_padding)
+
+    def cancelled() -> bool:
+        return cancel is not None and cancel.is_set()
+
+    sized = throttle is not None and throttle.wants_sizes
+
+    def lookup(p: Path) -> Tuple[Optional[os.stat_result], bool, Optional[ChangeResult]]:
+        if cache is None and not sized:
+            return None, False, None
+        try:
+            st = os.stat(p)
+        except OSError:
+            return None, False, None
+        if cache is None:
+            return st, False, None
+        hit = cache.lookup(p, st)
+        if hit is None:
+            return st, False, None
+        outcome, result = hit
+        if outcome == "changed" and config.write:
+            # Only a dry run can replay a pending change; a write run has to do it.
+            return st, False, None
+        return st, True, result
+
+    def remember(p: Path, st: Optional[os.stat_result], result: Optional[ChangeResult]) -> None:
+        if cache is None or st is None:
+            return
+        if config.write and result is not None and result.changed:
+            # The file was just rewritten, so st is stale; let the next run re-read it.
+            cache.forget(p)
+            return
+        cache.record(p, st, result)
+
+    timed = stats is not None
+    counted = progress is not None
+
+    def finish(p: Path, st: Optional[os.stat_result], outcome: WorkerResult) -> Optional[ChangeResult]:
+        result, tags, timings, _ = outcome
+        hand_off(result, tags)
+        remember(p, st, result)
+        if timings is not None:
+            stats.add_file(p, timings, backend_for(p).name)
+        return result
+
+    # A unit of work is one file, or with group_albums one folder's files. It
+    # is answered from the cache only if every file in it is; an album is
+    # otherwise processed whole, since each track's outcome depends on the rest.
+    Looked = List[Tuple[Optional[os.stat_result], bool, Optional[ChangeResult]]]
+
+    def cached(looked: Looked) -> Optional[List[WorkerResult]]:
+        if cache is None:
+            return None
+        if not all(hit for _, hit, _ in looked):
+            cache.misses += len(looked)
+            return None
+        cache.hits += len(looked)
+        return [(result, None, None, 0) for _, _, result in looked]
+
+    window = workers * 4
+
+    def admit(unit: List[Path], looked: Looked) -> None:
+        if throttle is not None:
+            throttle.admit(len(unit), sum(st.st_size for st, _, _ in looked if st is not None))
+
+    def check_memory() -> None:
+        nonlocal window
+        if throttle is None or not throttle.memory_over():
+            return
+        from retagger.limits import release_memory
+
+        window = workers
+        if cache is not None:
+            cache.release_seen()
+        release_memory()
+
+    def resolve_unit(
+        unit: List[Path], looked: Looked, outcomes: List[WorkerResult], hit: bool
+    ) -> Iterator[Tuple[Path, Optional[ChangeResult]]]:
+        for p, (st, _, _), outcome in zip(unit, looked, outcomes):
+            result = outcome[0] if hit else finish(p, st, outcome)
+            if progress is not None:
+                progress.add(result, outcome[3])
+            check_memory()
+            yield p, result
+
+    if workers == 1:
+        for unit in units:
+            if cancelled():
+                return
+            looked = [lookup(p) for p in unit]
+            outcomes = cached(looked)
+            hit = outcomes is not None
+            if not hit:
+                admit(unit, looked)
+                if cancelled():
+                    return
+                outcomes = work(unit, config, timed, counted)
+            yield from resolve_unit(unit, looked, outcomes, hit)
+        return
+
+    from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+    it = iter(units)
+    pool = _make_executor(executor, workers)
+
+    def submit(unit: List[Path]) -> Tuple[List[Path], Looked, Future, bool]:
+        looked = [lookup(p) for p in unit]
+        outcomes = cached(looked)
+        if outcomes is not None:
+            fut: Future = Future()
+            fut.set_result(outcomes)
+            return unit, looked, fut, True
+        admit(unit, looked)
+        return unit, looked, pool.submit(work, unit, config, timed, counted), False
+
+    def resolve(item: Tuple[List[Path], Looked, Future, bool]) -> Iterator[Tuple[Path, Optional[ChangeResult]]]:
+        unit, looked, fut, hit = item
+        return resolve_unit(unit, looked, fut.result(), hit)
+
+    try:
+        if ordered:
+            pending: deque = deque()
+            for unit in it:
+                if cancelled():
+                    break
+                pending.append(submit(unit))
+                while len(pending) >= window:
+                    yield from resolve(pending.popleft())
+            while pending:
+                item = pending.popleft()
+                if cancelled() and item[2].cancel():
+                    continue
+                yield from resolve(item)
+        else:
+            in_flight = {}
+            exhausted = False
+            while True:
+                while not exhausted and not cancelled() and len(in_flight) < window:
+                    unit = next(it, None)
+                    if unit is None:
+                        exhausted = True
+                        break
+                    item = submit(unit)
+                    in_flight[item[2]] = item
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    item = in_flight.pop(fut)
+                    if not fut.cancelled():
+                        yield from resolve(item)
+                if cancelled():
+                    for fut in in_flight:
+                        fut.cancel()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -3,25 +3,29 @@ import tkinter as tk
 from tkinter import filedialog, messagebox
 import customtkinter as ctk
 import json
-import os
 import threading
 import sys
+from collections import deque
 from pathlib import Path
-import queue
+
+from retagger.paths import get_config_dir
 
 # Configuration Setup
-APP_NAME = "retagger"
 def get_config_path():
-    xdg_config = os.environ.get("XDG_CONFIG_HOME")
-    if xdg_config:
-        base = Path(xdg_config)
-    else:
-        base = Path.home() / ".config"
-    config_dir = base / APP_NAME
-    config_dir.mkdir(parents=True, exist_ok=True)
-    return config_dir / "settings.json"
+    # Resolved (and the folder created) on first use, not at import time.
+    return get_config_dir() / "settings.json"
+
+# Background threads saving tags in write mode while scanning carries on.
+GUI_WRITERS = 2
+
+# Log view: lines kept in the widget (older ones are trimmed), most lines
+# inserted per UI tick, and how often the tick runs.
+LOG_MAX_LINES = 5000
+LOG_BATCH = 2000
+LOG_POLL_MS = 100
 
-CONFIG_FILE = get_config_path()
+def get_log_path():
+    return get_config_dir() / "last-run.log"
 
 def load_settings():
     defaults = {
@@ -30,11 +34,19 @@ def load_settings():
         "delimiter": "/",
         "window_size": "700x600",
         "update_album_artist": False,
-        "scan_subfolders": False
+        "scan_subfolders": False,
+        "workers": 1,
+        "use_cache": True,
+        "log_to_file": False,
+        "background_priority": False,
+        "max_files_per_sec": 0,
+        "max_mb_per_sec": 0,
+        "memory_limit_mb": 0
     }
-    if CONFIG_FILE.exists():
+    config_file = get_config_path()
+    if config_file.exists():
         try:
-            with open(CONFIG_FILE, "r") as f:
+            with open(config_file, "r") as f:
                 settings = json.load(f)
                 return {**defaults, **settings}
         except:
@@ -43,7 +55,7 @@ def load_settings():
 
 def save_settings(settings):
     try:
-        with open(CONFIG_FILE, "w") as f:
+        with open(get_config_path(), "w") as f:
             json.dump(settings, f, indent=4)
     except Exception as e:
         print(f"Error saving settings: {e}")
@@ -77,9 +89,23 @@ class RetagApp(ctk.CTk):
         self.set_album_artist_var = tk.BooleanVar(value=self.settings.get("update_album_artist", False))
         self.scan_subfolders_var = tk.BooleanVar(value=self.settings.get("scan_subfolders", False))
         self.write_changes_var = tk.BooleanVar(value=False)
+        self.workers_var = tk.StringVar(value=str(self.settings.get("workers", 1)))
+        self.use_cache_var = tk.BooleanVar(value=self.settings.get("use_cache", True))
+        self.log_to_file_var = tk.BooleanVar(value=self.settings.get("log_to_file", False))
+        self.background_var = tk.BooleanVar(value=self.settings.get("background_priority", False))
+        self.max_rate_var = tk.StringVar(value=str(self.settings.get("max_files_per_sec", 0)))
+        self.max_mb_rate_var = tk.StringVar(value=str(self.settings.get("max_mb_per_sec", 0)))
+        self.memory_limit_var = tk.StringVar(value=str(self.settings.get("memory_limit_mb", 0)))
         self.is_running = False
         self.stop_requested = False
-        self.log_queue = queue.Queue()
+        self.stop_event = threading.Event()
+        # Lines waiting for the log view. Bounded like the view itself, so a
+        # run that outpaces the UI drops its oldest lines instead of growing.
+        self.log_lines = deque(maxlen=LOG_MAX_LINES)
+        self.log_file = None
+        # The running pass's core Progress; the UI tick reads a snapshot of it.
+        self.progress = None
+        self._shown_progress = ""
 
         self._create_widgets()
         self._check_queue()
@@ -93,6 +119,13 @@ class RetagApp(ctk.CTk):
         self.settings["delimiter"] = self.delimiter_var.get()
         self.settings["update_album_artist"] = self.set_album_artist_var.get()
         self.settings["scan_subfolders"] = self.scan_subfolders_var.get()
+        self.settings["workers"] = self._get_workers()
+        self.settings["use_cache"] = self.use_cache_var.get()
+        self.settings["log_to_file"] = self.log_to_file_var.get()
+        self.settings["background_priority"] = self.background_var.get()
+        self.settings["max_files_per_sec"] = self._get_limit(self.max_rate_var)
+        self.settings["max_mb_per_sec"] = self._get_limit(self.max_mb_rate_var)
+        self.settings["memory_limit_mb"] = int(self._get_limit(self.memory_limit_var))
         self.settings["appearance_mode"] = ctk.get_appearance_mode().lower()
         self.settings["window_size"] = f"{self.winfo_width()}x{self.winfo_height()}"
         save_settings(self.settings)
@@ -141,6 +174,9 @@ class RetagApp(ctk.CTk):
         ctk.CTkLabel(options_subframe, text="Delimiter:").grid(row=0, column=0, padx=(5, 2), pady=5, sticky="w")
         ctk.CTkEntry(options_subframe, textvariable=self.delimiter_var, width=50).grid(row=0, column=1, padx=5, pady=5, sticky="w")
 
+        ctk.CTkLabel(options_subframe, text="Workers:").grid(row=0, column=2, padx=(20, 2), pady=5, sticky="w")
+        ctk.CTkEntry(options_subframe, textvariable=self.workers_var, width=50).grid(row=0, column=3, padx=5, pady=5, sticky="w")
+
         ctk.CTkCheckBox(options_subframe, text="Update Album Artist", variable=self.set_album_artist_var).grid(row=1, column=0, padx=5, pady=10, sticky="w")
         
         ctk.CTkCheckBox(options_subframe, text="Scan Subfolders", variable=self.scan_subfolders_var).grid(row=1, column=1, padx=5, pady=10, sticky="w")
@@ -148,6 +184,28 @@ class RetagApp(ctk.CTk):
         self.write_mode_switch = ctk.CTkSwitch(options_subframe, text="Write Changes", variable=self.write_changes_var, progress_color="#ff4b4b")
         self.write_mode_switch.grid(row=1, column=2, padx=20, pady=10, sticky="w")
 
+        ctk.CTkCheckBox(options_subframe, text="Use Scan Cache", variable=self.use_cache_var).grid(row=2, column=0, padx=5, pady=(0, 10), sticky="w")
+
+        ctk.CTkCheckBox(options_subframe, text="Log Files to last-run.log", variable=self.log_to_file_var).grid(row=2, column=1, columnspan=2, padx=5, pady=(0, 10), sticky="w")
+
+        # Elsewhere than Linux the priority can only be lowered for the whole
+        # app, UI included, and not raised again, so the option isn't offered.
+        if sys.platform.startswith("linux"):
+            ctk.CTkCheckBox(options_subframe, text="Background Priority", variable=self.background_var).grid(row=3, column=0, padx=5, pady=(0, 10), sticky="w")
+        else:
+            self.background_var.set(False)
+            ctk.CTkCheckBox(options_subframe, text="Background Priority (Linux only)", variable=self.background_var, state="disabled").grid(row=3, column=0, padx=5, pady=(0, 10), sticky="w")
+
+        ctk.CTkLabel(options_subframe, text="Memory limit MB:").grid(row=3, column=2, padx=(20, 2), pady=(0, 10), sticky="w")
+        ctk.CTkEntry(options_subframe, textvariable=self.memory_limit_var, width=50).grid(row=3, column=3, padx=5, pady=(0, 10), sticky="w")
+
+        # Rate caps; 0 means no limit.
+        ctk.CTkLabel(options_subframe, text="Max files/s:").grid(row=4, column=0, padx=(5, 2), pady=(0, 10), sticky="w")
+        ctk.CTkEntry(options_subframe, textvariable=self.max_rate_var, width=50).grid(row=4, column=1, padx=5, pady=(0, 10), sticky="w")
+
+        ctk.CTkLabel(options_subframe, text="Max MB/s:").grid(row=4, column=2, padx=(20, 2), pady=(0, 10), sticky="w")
+        ctk.CTkEntry(options_subframe, textvariable=self.max_mb_rate_var, width=50).grid(row=4, column=3, padx=5, pady=(0, 10), sticky="w")
+
         # Action Button
         self.run_btn = ctk.CTkButton(control_frame, text="Start Processing", command=self._start_processing, height=40, font=ctk.CTkFont(weight="bold"))
         self.run_btn.grid(row=3, column=0, columnspan=3, padx=15, pady=(5, 15), sticky="ew")
@@ -160,9 +218,23 @@ class RetagApp(ctk.CTk):
 
         ctk.CTkLabel(log_container, text="Process Log", font=ctk.CTkFont(weight="bold")).grid(row=0, column=0, padx=15, pady=(10, 5), sticky="w")
 
+        self.progress_label = ctk.CTkLabel(log_container, text="")
+        self.progress_label.grid(row=0, column=0, padx=15, pady=(10, 5), sticky="e")
+
+        self.progress_bar = ctk.CTkProgressBar(log_container)
+        self.progress_bar.grid(row=4, column=0, padx=15, pady=(0, 15), sticky="ew")
+        self.progress_bar.set(0)
+
         self.log_area = ctk.CTkTextbox(log_container, font=("monaco", 12))
         self.log_area.grid(row=1, column=0, padx=15, pady=(0, 15), sticky="nsew")
 
+        # --- Run Stats ---
+        ctk.CTkLabel(log_container, text="Run Stats", font=ctk.CTkFont(weight="bold")).grid(row=2, column=0, padx=15, pady=(0, 5), sticky="w")
+
+        self.stats_area = ctk.CTkTextbox(log_container, font=("monaco", 12), height=140)
+        self.stats_area.grid(row=3, column=0, padx=15, pady=(0, 15), sticky="ew")
+        self.stats_area.configure(state="disabled")
+
     def _browse_directory(self):
         folder_selected = filedialog.askdirectory()
         if folder_selected:
@@ -176,21 +248,59 @@ class RetagApp(ctk.CTk):
             ctk.set_appearance_mode("dark")
             self.theme_btn.configure(text="toggle dark/light")
 
-    def _log(self, message):
-        self.log_queue.put(message + "\n")
+    def _get_workers(self):
+        try:
+            return max(1, int(self.workers_var.get()))
+        except ValueError:
+            return 1
+
+    def _get_limit(self, var):
+        try:
+            return max(0.0, float(var.get()))
+        except ValueError:
+            return 0.0
+
+    def _log(self, message, detail=False):
+        # Per-file lines are "detail": with a log file they only go there,
+        # so the view just shows the start/stop/summary lines.
+        log_file = self.log_file
+        if log_file is not None:
+            log_file.write(message + "\n")
+            if detail:
+                return
+        self.log_lines.append(message)
 
     def _check_queue(self):
-        """Poll the queue to update the UI from the thread safely"""
-        while not self.log_queue.empty():
-            msg = self.log_queue.get_nowait()
-            self.log_area.insert(tk.END, msg)
+        """Poll the pending lines to update the UI from the thread safely"""
+        lines = []
+        try:
+            for _ in range(LOG_BATCH):
+                lines.append(self.log_lines.popleft())
+        except IndexError:
+            pass
+        if lines:
+            # One insert per tick, then trim the view back to LOG_MAX_LINES.
+            self.log_area.insert(tk.END, "\n".join(lines) + "\n")
+            excess = int(self.log_area.index("end-1c").split(".")[0]) - 1 - LOG_MAX_LINES
+            if excess > 0:
+                self.log_area.delete("1.0", f"{excess + 1}.0")
             self.log_area.see(tk.END)
-        
-        self.after(100, self._check_queue)
+
+        # Progress is redrawn once per tick however fast files go by.
+        if self.progress is not None:
+            snap = self.progress.snapshot()
+            text = snap.format()
+            if text != self._shown_progress:
+                self._shown_progress = text
+                self.progress_label.configure(text=text)
+                self.progress_bar.set(snap.fraction)
+
+        self.after(LOG_POLL_MS, self._check_queue)
 
     def _start_processing(self):
         if self.is_running:
             self.stop_requested = True
+            self.stop_event.set()
             self.run_btn.configure(state='disabled', text="Stopping...")
             return
 
@@ -206,12 +316,28 @@ class RetagApp(ctk.CTk):
 
         self.is_running = True
         self.stop_requested = False
+        self.stop_event.clear()
         self.run_btn.configure(text="Stop Processing", fg_color="#ff4b4b", hover_color="#ff3333")
         self.log_area.delete("0.0", tk.END)
+        self.log_lines.clear()
+        self.progress = None
+        self._shown_progress = ""
+        self.progress_label.configure(text="")
+        self.progress_bar.set(0)
+        self._show_stats("")
+
+        if self.log_to_file_var.get():
+            log_path = get_log_path()
+            try:
+                self.log_file = open(log_path, "w", encoding="utf-8")
+            except OSError as e:
+                self._log(f"[WARN] couldn't open log file {log_path}: {e}")
         
         mode_str = "WRITE MODE" if self.write_changes_var.get() else "DRY RUN"
         self._log(f"[START] starting scan in {mode_str}...")
         self._log(f"  Target: {root_path}")
+        if self.log_file is not None:
+            self._log(f"  Per-file log: {self.log_file.name}")
         self._log("-" * 50)
 
         # run in separate thread to keep UI responsive
@@ -220,61 +346,125 @@ class RetagApp(ctk.CTk):
 
     def _process_thread(self, root_path):
         # import here for faster app startup
-        from retagger import core
-        
+        from retagger import cache, core, limits, progress, stats
+
+        scan_cache = None
+        write_queue = None
         try:
-            mp3s = core.get_mp3_files(root_path, recursive=self.scan_subfolders_var.get())
-            if not mp3s:
-                self._log(f"no .mp3 files found in target directory")
-                if not self.scan_subfolders_var.get():
-                    self._log(f"(maybe you forgot to enable 'Scan Subfolders'?)")
-                self._finish_processing()
-                return
+            files = core.iter_audio_files(root_path, recursive=self.scan_subfolders_var.get())
 
             config = core.RetagConfig(
                 delimiter=self.delimiter_var.get(),
                 write=self.write_changes_var.get(),
                 set_albumartist=self.set_album_artist_var.get(),
             )
+            run_limits = limits.ResourceLimits(
+                files_per_s=self._get_limit(self.max_rate_var),
+                mb_per_s=self._get_limit(self.max_mb_rate_var),
+                memory_mb=int(self._get_limit(self.memory_limit_var)),
+                background=self.background_var.get(),
+            )
+            throttle = None
+            if run_limits:
+                config.limits = run_limits
+                throttle = limits.Throttle(run_limits, self.stop_event)
+                if run_limits.background:
+                    # Only this worker thread and the pools it starts; the UI stays responsive.
+                    throttle.priority = limits.lower_priority(thread_only=True)
 
             changed_count = 0
             scanned_count = 0
-            total = len(mp3s)
-
-            for p in mp3s:
-                if self.stop_requested:
-                    self._log("\n[STOP] stop requested by user")
-                    break
-                    
+            run_progress = progress.Progress()
+            run_progress.count(core.iter_audio_files(root_path, recursive=self.scan_subfolders_var.get()))
+            self.progress = run_progress
+            run_stats = stats.RunStats()
+
+            if self.use_cache_var.get():
+                scan_cache = cache.ScanCache(config=config)
+            if config.write:
+                write_queue = core.WriteQueue(writers=GUI_WRITERS, stats=run_stats)
+
+            results = core.process_library(
+                files,
+                config,
+                workers=self._get_workers(),
+                cancel=self.stop_event,
+                cache=scan_cache,
+                write_queue=write_queue,
+                stats=run_stats,
+                progress=run_progress,
+                throttle=throttle,
+            )
+            for p, result in results:
                 scanned_count += 1
-                try:
-                    result = core.process_file(p, config)
-                    
-                    if result:
-                        if result.error:
-                             self._log(f"[SKIP] {p.name}: {result.error}")
-                        elif result.changed:
-                            changed_count += 1
-                            self._log(f"[CHANGE] {p.name}")
-                            self._log(f"  Old: {result.old_artist} - {result.old_title}")
-                            self._log(f"  New: {result.new_artist} - {result.new_title}")
-                            self._log("")
-                except Exception as e:
-                     self._log(f"[ERROR] {p.name}: {e}")
+                if result:
+                    if result.error:
+                         self._log(f"[SKIP] {p.name}: {result.error}", detail=True)
+                    elif result.skip_reason:
+                         self._log(f"[SKIP] {p.name}: {result.skip_reason}", detail=True)
+                    elif result.changed:
+                        changed_count += 1
+                        self._log(
+                            f"[CHANGE] {p.name}\n"
+                            f"  Old: {result.old_artist} - {result.old_title}\n"
+                            f"  New: {result.new_artist} - {result.new_title}\n",
+                            detail=True,
+                        )
+
+            if write_queue is not None:
+                # On Stop, saves still waiting in the queue are dropped, so
+                # those files are left exactly as they were.
+                write_queue.close(drain=not self.stop_requested)
+                for failed in write_queue.failures:
+                    self._log(f"[WRITE FAILED] {failed.path.name}: {failed.error}")
+                if write_queue.discarded:
+                    self._log(f"[STOP] {len(write_queue.discarded)} queued writes cancelled, files left untouched")
+                changed_count -= len(write_queue.failures) + len(write_queue.discarded)
+                write_queue = None
+
+            if self.stop_requested:
+                self._log("\n[STOP] stop requested by user")
+            elif not scanned_count:
+                self._log(f"no audio files found in target directory")
+                if not self.scan_subfolders_var.get():
+                    self._log(f"(maybe you forgot to enable 'Scan Subfolders'?)")
+                return
 
             self._log("-" * 50)
             self._log(f"[DONE] scanned {scanned_count} files")
             self._log(f"  files matched/updated: {changed_count}")
+            if throttle is not None:
+                self._log(f"  {throttle.summary()}")
+            summary = run_stats.summary()
+            self.after(0, lambda: self._show_stats(summary))
+            if scan_cache is not None:
+                self._log(f"  answered from cache: {scan_cache.hits}")
+                if not self.stop_requested:
+                    scan_cache.prune(root_path)
 
         except Exception as e:
             self._log(f"[FATAL] {e}")
         
         finally:
+            if write_queue is not None:
+                write_queue.close(drain=False)
+            if scan_cache is not None:
+                scan_cache.close()
+            if self.log_file is not None:
+                self.log_file.close()
+                self.log_file = None
             self._finish_processing()
 
+    def _show_stats(self, text):
+        self.stats_area.configure(state="normal")
+        self.stats_area.delete("0.0", tk.END)
+        self.stats_area.insert(tk.END, text)
+        self.stats_area.configure(state="disabled")
+
     def _finish_processing(self):
         self.is_running = False
         self.stop_requested = False
+        self.stop_event.clear()
         self.after(0, lambda: self.run_btn.configure(
             state='normal', 
             text="Start Processing",
@@ -283,6 +473,11 @@ class RetagApp(ctk.CTk):
         ))
 
 
-if __name__ == "__main__":
+def main():
     app = RetagApp()
     app.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    main()
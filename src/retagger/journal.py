@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import IO, Iterator, Optional
+
+from retagger.core import ChangeResult, RetagConfig, backend_for
+
+JOURNAL_VERSION = 1
+
+# fsync the journal after this many records (and always on close).
+SYNC_EVERY = 64
+
+
+class Journal:
+    """
+    Write-ahead log for write mode, one JSON object per line. Before a file
+    is saved, begin() records its old and new artist/title/albumartist;
+    commit() marks the save as done. Each record reaches the OS before the
+    save starts, so a killed run never loses one; fsync is batched every
+    `sync_every` records, which keeps the journal cheap on big runs.
+
+    Opening an existing journal appends to it (that's how a run is resumed),
+    as long as it was written with the same delimiter and albumartist setting.
+    """
+
+    def __init__(self, path: Path, config: RetagConfig, sync_every: int = SYNC_EVERY):
+        self.path = path
+        self.sync_every = max(1, sync_every)
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        header = _read_header(path) if path.exists() and path.stat().st_size else None
+        if header is not None:
+            if (header.get("delimiter"), bool(header.get("set_albumartist"))) != (
+                config.delimiter,
+                config.set_albumartist,
+            ):
+                raise ValueError(f"{path} was written with different --delimiter/--set-albumartist options")
+        self._fh: IO[str] = open(path, "a", encoding="utf-8")
+        if header is None:
+            self._write(
+                {
+                    "type": "journal",
+                    "version": JOURNAL_VERSION,
+                    "delimiter": config.delimiter,
+                    "set_albumartist": config.set_albumartist,
+                }
+            )
+            self._sync()
+
+    def begin(self, result: ChangeResult) -> None:
+        self._write(
+            {
+                "type": "write",
+                # Absolute, so undo and --resume work from any directory.
+                "path": os.path.abspath(result.path),
+                "old": {
+                    "artist": result.old_artist,
+                    # None: there was no title, and undo takes it out again.
+                    "title": result.old_title if result.had_title else None,
+                    "albumartist": result.old_albumartist,
+                },
+                "new": {
+                    "artist": result.new_artist,
+                    "title": result.new_title,
+                    "albumartist": result.new_albumartist,
+                },
+            }
+        )
+
+    def commit(self, result: ChangeResult) -> None:
+        self._write({"type": "done", "path": os.path.abspath(result.path)})
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh.closed:
+                return
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._fh.close()
+
+    def _write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._fh.write(line)
+            self._fh.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every:
+                self._sync()
+
+    def _sync(self) -> None:
+        os.fsync(self._fh.fileno())
+        self._unsynced = 0
+
+
+def _read_header(path: Path) -> dict:
+    with open(path, encoding="utf-8") as fh:
+        header = json.loads(fh.readline() or "{}")
+    if header.get("type") != "journal":
+        raise ValueError(f"{path} is not a retagger journal")
+    if header.get("version") != JOURNAL_VERSION:
+        raise ValueError(f"{path}: unsupported journal version {header.get('version')}")
+    return header
+
+
+def read_journal(path: Path) -> Iterator[dict]:
+    """Yield the write/done records of a journal, skipping a torn last line."""
+    _read_header(path)
+    with open(path, encoding="utf-8") as fh:
+        fh.readline()
+        for line in fh:
+            if not line.endswith("\n"):
+                break  # the run died mid-append
+            if line.strip():
+                yield json.loads(line)
+
+
+def completed_paths(path: Path) -> set[Path]:
+    """Files whose journaled save finished; a resumed run can skip these."""
+    return {Path(os.path.abspath(rec["path"])) for rec in read_journal(path) if rec.get("type") == "done"}
+
+
+def undo_entry(path: Path, old: dict, new: dict) -> ChangeResult:
+    """
+    Put one file's old tags back, but only if it still has the tags the
+    journal says were written; a file that was edited since is left alone.
+    A save that was begun but never finished is caught the same way: the
+    file either still has its old tags (nothing to do) or the new ones.
+    """
+    result = ChangeResult(
+        path=path,
+        old_artist=new["artist"],
+        new_artist=old["artist"],
+        old_title=new["title"],
+        new_title=old["title"] or "",
+        changed=False,
+        old_albumartist=new["albumartist"],
+        new_albumartist=old["albumartist"],
+    )
+    try:
+        with open(path, "rb+") as fh:
+            backend = backend_for(path)
+            tags = backend.read(fh)
+            if tags is None:
+                result.skip_reason = backend.no_tags
+                return result
+            current = {
+                key: (tags.get(key, [""])[0] or "").strip()
+                for key in ("artist", "title", "albumartist")
+            }
+            if current == dict(old, title=old["title"] or ""):
+                result.skip_reason = "already has its old tags"
+                return result
+            if current != new:
+                result.skip_reason = "tags changed since the journaled write"
+                return result
+
+            tags["artist"] = [old["artist"]]
+            if old["title"] is not None:
+                tags["title"] = [old["title"]]
+            else:
+                del tags["title"]
+            if old["albumartist"] != new["albumartist"]:
+                if old["albumartist"]:
+                    tags["albumartist"] = [old["albumartist"]]
+                else:
+                    del tags["albumartist"]
+            saved = tags.save(fh)
+    except Exception as e:
+        result.error = str(e)
+        return result
+
+    result.changed = True
+    result.in_place = saved.in_place
+    result.bytes_written = saved.bytes_written
+    return result
+
+
+def undo_journal(path: Path, cancel: Optional[threading.Event] = None) -> Iterator[ChangeResult]:
+    """
+    Revert the writes recorded in a journal, newest first. Each file is
+    restored to the oldest tags the journal has for it, so undoing a resumed
+    run that touched a file twice still gets back to the original.
+    """
+    first: dict[Path, dict] = {}
+    last: dict[Path, dict] = {}
+    for rec in read_journal(path):
+        if rec.get("type") != "write":
+            continue
+        p = Path(rec["path"])
+        first.setdefault(p, rec)
+        last.pop(p, None)
+        last[p] = rec
+
+    for p in reversed(list(last)):
+        if cancel is not None and cancel.is_set():
+            return
+        yield undo_entry(p, first[p]["old"], last[p]["new"])
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import gc
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+# How many files process_library lets through between two looks at the RSS,
+# and how far apart the looks may get while it stays over the ceiling.
+MEMORY_CHECK_EVERY = 64
+MEMORY_CHECK_MAX = 64 * 64
+
+# ioprio_set(2) has no libc wrapper, so it's called by syscall number.
+IOPRIO_SYSCALLS = {"x86_64": 251, "aarch64": 30, "i686": 289, "i386": 289, "armv7l": 314}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+
+@dataclass
+class ResourceLimits:
+    """
+    Caps for a run sharing the machine with other services (0 = no cap).
+
+    files_per_s and mb_per_s limit how fast files are opened; files answered
+    from the scan cache don't count. MB are the files' sizes, the most a file
+    can cost in reads and rewrites. memory_mb is a ceiling on this process's
+    resident memory (see MemoryGuard). background asks for idle CPU and I/O
+    priority; process_library leaves that to the caller, who runs
+    lower_priority() before starting, since it can't be undone.
+    """
+
+    files_per_s: float = 0.0
+    mb_per_s: float = 0.0
+    memory_mb: int = 0
+    background: bool = False
+
+    def __bool__(self) -> bool:
+        return bool(self.files_per_s or self.mb_per_s or self.memory_mb or self.background)
+
+    def describe(self) -> str:
+        parts = []
+        if self.files_per_s:
+            parts.append(f"{self.files_per_s:g} files/s")
+        if self.mb_per_s:
+            parts.append(f"{self.mb_per_s:g} MB/s")
+        if self.memory_mb:
+            parts.append(f"{self.memory_mb} MB memory")
+        if self.background:
+            parts.append("background priority")
+        return ", ".join(parts) or "none"
+
+
+class RateLimiter:
+    """
+    Token bucket: `rate` tokens a second, up to one second's worth saved up,
+    so a run can't burst ahead after a slow patch. A request bigger than
+    what's in the bucket waits for the shortfall. Only used from the thread
+    that hands out work.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.burst = max(rate, 1.0)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.waited = 0.0
+
+    def acquire(self, n: float = 1.0, cancel: Optional[threading.Event] = None) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= n
+        if self.tokens >= 0:
+            return
+        wait = -self.tokens / self.rate
+        # The wait pays off the debt; refilling starts again once it's over.
+        self.tokens = 0.0
+        self.last = now + wait
+        self.waited += wait
+        if cancel is not None:
+            cancel.wait(wait)
+        else:
+            time.sleep(wait)
+
+
+def current_rss() -> Optional[int]:
+    """This process's resident memory in bytes, or None if we can't tell."""
+    try:
+        with open("/proc/self/statm", "rb") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+def peak_rss() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def release_memory() -> None:
+    """Drop the name memos (they refill on demand) and collect garbage."""
+    from retagger import core
+
+    core.norm.cache_clear()
+    core._remix_window.cache_clear()
+    aliases = sys.modules.get("retagger.aliases")
+    if aliases is not None:
+        aliases.compact_key.cache_clear()
+        aliases.name_parts.cache_clear()
+    gc.collect()
+
+
+class MemoryGuard:
+    """
+    Watches the RSS against a ceiling. process_library checks it every
+    MEMORY_CHECK_EVERY files; once over, it frees what it can (the memos,
+    the scan cache's list of paths seen) and keeps only one unit of work
+    per worker in flight for the rest of the run. While it stays over, each
+    check waits twice as long as the last, so a ceiling that can't be met
+    doesn't turn into collecting garbage every few files.
+    """
+
+    def __init__(self, limit_mb: int):
+        self.limit = limit_mb * 1024 * 1024
+        self.peak = 0
+        self.pressure = 0
+        self._every = MEMORY_CHECK_EVERY
+        self._since = 0
+
+    def over(self) -> bool:
+        self._since += 1
+        if self._since < self._every:
+            return False
+        self._since = 0
+        rss = current_rss()
+        if rss is None:
+            return False
+        self.peak = max(self.peak, rss)
+        if rss <= self.limit:
+            self._every = MEMORY_CHECK_EVERY
+            return False
+        self._every = min(self._every * 2, MEMORY_CHECK_MAX)
+        self.pressure += 1
+        return True
+
+
+def _set_idle_io_priority() -> bool:
+    import ctypes
+    import ctypes.util
+    import platform
+
+    number = IOPRIO_SYSCALLS.get(platform.machine())
+    libc_name = ctypes.util.find_library("c")
+    if number is None or not libc_name:
+        return False
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+    return libc.syscall(number, IOPRIO_WHO_PROCESS, 0, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) == 0
+
+
+def lower_priority(thread_only: bool = False) -> List[str]:
+    """
+    Idle CPU and I/O priority for this process, as far as the platform
+    allows. Returns what was applied, for the summary.
+
+    On Linux these are per thread and inherited by threads (and processes)
+    started afterwards, so call it before any worker pool exists. Elsewhere
+    (macOS) os.nice lowers the whole process for good; with thread_only,
+    nothing is changed there, for callers such as the GUI whose other
+    threads must keep their priority.
+    """
+    applied: List[str] = []
+    if thread_only and not sys.platform.startswith("linux"):
+        return applied
+    if hasattr(os, "nice"):
+        try:
+            applied.append(f"nice {os.nice(19)}")
+        except OSError:
+            pass
+    if hasattr(os, "SCHED_IDLE"):
+        try:
+            os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+            applied.append("idle CPU scheduling")
+        except OSError:
+            pass
+    if sys.platform.startswith("linux") and _set_idle_io_priority():
+        applied.append("idle I/O class")
+    return applied
+
+
+class Throttle:
+    """
+    A run's ResourceLimits in action: process_library calls admit() before
+    each unit of work it opens files for, and checks memory_over() as results
+    come back. The counters end up in the summary.
+    """
+
+    def __init__(self, limits: ResourceLimits, cancel: Optional[threading.Event] = None):
+        self.limits = limits
+        self.cancel = cancel
+        self.files = RateLimiter(limits.files_per_s) if limits.files_per_s else None
+        self.bytes = RateLimiter(limits.mb_per_s * 1024 * 1024) if limits.mb_per_s else None
+        self.memory = MemoryGuard(limits.memory_mb) if limits.memory_mb else None
+        self.priority: List[str] = []
+
+    @property
+    def wants_sizes(self) -> bool:
+        return self.bytes is not None
+
+    @property
+    def waited(self) -> float:
+        return sum(r.waited for r in (self.files, self.bytes) if r is not None)
+
+    def admit(self, files: int, size: int) -> None:
+        if self.files is not None:
+            self.files.acquire(files, self.cancel)
+        if self.bytes is not None and size:
+            self.bytes.acquire(size, self.cancel)
+
+    def memory_over(self) -> bool:
+        return self.memory is not None and self.memory.over()
+
+    def summary(self) -> str:
+        line = f"Limits: {self.limits.describe()}"
+        notes = []
+        if self.files is not None or self.bytes is not None:
+            notes.append(f"waited {self.waited:.1f}s")
+        if self.memory is not None:
+            peak = max(self.memory.peak, peak_rss() or 0)
+            notes.append(f"peak RSS {peak / (1024 * 1024):.0f} MB")
+            if self.memory.pressure:
+                notes.append(f"over the ceiling {self.memory.pressure} times")
+        if self.limits.background:
+            notes.append(", ".join(self.priority) or "priority unchanged")
+        if notes:
+            line += f" ({'; '.join(notes)})"
+        return line
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import csv
+import json
+import sys
+from typing import IO, TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from retagger.core import ChangeResult
+
+FORMATS = ("text", "jsonl", "csv")
+
+FIELDS = (
+    "status",
+    "path",
+    "old_artist",
+    "new_artist",
+    "old_title",
+    "new_title",
+    "error",
+    "skip_reason",
+    "in_place",
+    "bytes_written",
+)
+
+
+def result_status(result: ChangeResult) -> str:
+    if result.error:
+        return "error"
+    if result.skip_reason:
+        return "skipped"
+    if result.changed:
+        return "changed"
+    return "unchanged"
+
+
+def result_to_record(result: ChangeResult, status: Optional[str] = None) -> dict:
+    return {
+        "status": status or result_status(result),
+        "path": str(result.path),
+        "old_artist": result.old_artist,
+        "new_artist": result.new_artist,
+        "old_title": result.old_title,
+        "new_title": result.new_title,
+        "error": result.error,
+        "skip_reason": result.skip_reason,
+        "in_place": result.in_place,
+        "bytes_written": result.bytes_written,
+    }
+
+
+class TextWriter:
+    """The human-readable output retagger has always printed."""
+
+    def __init__(self, stream: IO[str]):
+        self.stream = stream
+
+    def write(self, result: ChangeResult, status: Optional[str] = None) -> None:
+        status = status or result_status(result)
+        if status == "error":
+            print(f"[skip] {result.path} (couldn't read tags: {result.error})", file=self.stream)
+        elif status == "skipped":
+            print(f"[skip] {result.path} ({result.skip_reason})", file=self.stream)
+        elif status == "write_failed":
+            print(f"[write failed] {result.path} ({result.error})", file=self.stream)
+        elif status == "not_written":
+            print(f"[not written] {result.path} (interrupted)", file=self.stream)
+        elif status == "changed":
+            print(f"\n{result.path}", file=self.stream)
+            print(f"  Artist: {result.old_artist}  ->  {result.new_artist}", file=self.stream)
+            print(f"  Title : {result.old_title}  ->  {result.new_title}", file=self.stream)
+
+    def summary(self, summary: dict) -> None:
+        pass
+
+
+class JsonlWriter:
+    """One JSON object per line, plus a final {"type": "summary", ...} line."""
+
+    def __init__(self, stream: IO[str]):
+        self.stream = stream
+
+    def write(self, result: ChangeResult, status: Optional[str] = None) -> None:
+        record = {"type": "result", **result_to_record(result, status)}
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def summary(self, summary: dict) -> None:
+        self.stream.write(json.dumps({"type": "summary", **summary}) + "\n")
+
+
+class CsvWriter:
+    """
+    A header row and one row per result. A differently shaped summary row
+    would break CSV readers, so the summary goes to stderr as one JSON line.
+    """
+
+    def __init__(self, stream: IO[str]):
+        self.stream = stream
+        self._writer = csv.DictWriter(stream, fieldnames=FIELDS)
+        self._writer.writeheader()
+
+    def write(self, result: ChangeResult, status: Optional[str] = None) -> None:
+        self._writer.writerow(result_to_record(result, status))
+
+    def summary(self, summary: dict) -> None:
+        print(json.dumps({"type": "summary", **summary}), file=sys.stderr)
+
+
+def make_writer(fmt: str, stream: IO[str]):
+    if fmt == "jsonl":
+        return JsonlWriter(stream)
+    if fmt == "csv":
+        return CsvWriter(stream)
+    if fmt == "text":
+        return TextWriter(stream)
+    raise ValueError(f"unknown output format: {fmt!r}")
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+APP_NAME = "retagger"
+
+
+def get_config_dir() -> Path:
+    xdg_config = os.environ.get("XDG_CONFIG_HOME")
+    if xdg_config:
+        base = Path(xdg_config)
+    else:
+        base = Path.home() / ".config"
+    config_dir = base / APP_NAME
+    config_dir.mkdir(parents=True, exist_ok=True)
+    return config_dir
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional
+
+from retagger.core import ChangeResult, RetagConfig, backend_for
+
+PLAN_VERSION = 1
+
+
+@dataclass
+class PlanEntry:
+    path: Path
+    size: int
+    mtime_ns: int
+    old_artist: str
+    new_artist: str
+    old_title: str
+    new_title: str
+    set_albumartist: bool
+
+    def to_result(self, changed: bool = False, **kwargs) -> ChangeResult:
+        return ChangeResult(
+            path=self.path,
+            old_artist=self.old_artist,
+            new_artist=self.new_artist,
+            old_title=self.old_title,
+            new_title=self.new_title,
+            changed=changed,
+            **kwargs,
+        )
+
+
+class PlanWriter:
+    """
+    Writes the changes found by a dry run to a JSON Lines plan: a header line
+    with the config, then one line per file with its new tags and the
+    stat signature it had when it was analysed.
+    """
+
+    def __init__(self, path: Path, config: RetagConfig):
+        self.path = path
+        self.config = config
+        self.count = 0
+        self._fh: IO[str] = open(path, "w", encoding="utf-8")
+        self._write(
+            {
+                "type": "plan",
+                "version": PLAN_VERSION,
+                "delimiter": config.delimiter,
+                "set_albumartist": config.set_albumartist,
+            }
+        )
+
+    def add(self, result: ChangeResult) -> None:
+        try:
+            st = os.stat(result.path)
+        except OSError:
+            return
+        self._write(
+            {
+                "type": "change",
+                # Absolute, so 'retagger apply' works from any directory.
+                "path": os.path.abspath(result.path),
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "old_artist": result.old_artist,
+                "new_artist": result.new_artist,
+                "old_title": result.old_title,
+                "new_title": result.new_title,
+            }
+        )
+        self.count += 1
+
+    def close(self) -> None:
+        self._fh.close()
+
+    def _write(self, record: dict) -> None:
+        self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def read_plan(path: Path) -> Iterator[PlanEntry]:
+    with open(path, encoding="utf-8") as fh:
+        header = json.loads(fh.readline() or "{}")
+        if header.get("type") != "plan":
+            raise ValueError(f"{path} is not a retagger plan")
+        if header.get("version") != PLAN_VERSION:
+            raise ValueError(f"{path}: unsupported plan version {header.get('version')}")
+        set_albumartist = bool(header.get("set_albumartist"))
+
+        for line in fh:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            if rec.get("type") != "change":
+                continue
+            yield PlanEntry(
+                path=Path(rec["path"]),
+                size=rec["size"],
+                mtime_ns=rec["mtime_ns"],
+                old_artist=rec["old_artist"],
+                new_artist=rec["new_artist"],
+                old_title=rec["old_title"],
+                new_title=rec["new_title"],
+                set_albumartist=set_albumartist,
+            )
+
+
+def apply_entry(entry: PlanEntry, reserve_padding: int = 0) -> ChangeResult:
+    """
+    Write one planned change without re-running the rules. The file is only
+    touched if its size and mtime still match the plan and its current
+    artist/title are still the ones the plan was made from.
+    """
+    try:
+        st = os.stat(entry.path)
+    except OSError as e:
+        return entry.to_result(error=str(e))
+    if st.st_size != entry.size or st.st_mtime_ns != entry.mtime_ns:
+        return entry.to_result(skip_reason="file changed since the plan was made")
+
+    try:
+        with open(entry.path, "rb+") as fh:
+            backend = backend_for(entry.path)
+            tags = backend.read(fh)
+            if tags is None:
+                return entry.to_result(skip_reason=backend.no_tags)
+            artist = (tags.get("artist", [""])[0] or "").strip()
+            title = (tags.get("title", [entry.path.stem])[0] or entry.path.stem).strip()
+            if artist != entry.old_artist or title != entry.old_title:
+                return entry.to_result(skip_reason="tags changed since the plan was made")
+
+            tags["artist"] = [entry.new_artist]
+            tags["title"] = [entry.new_title]
+            if entry.set_albumartist:
+                tags["albumartist"] = [entry.new_artist]
+            saved = tags.save(fh, reserve_padding)
+    except Exception as e:
+        return entry.to_result(error=str(e))
+
+    return entry.to_result(changed=True, in_place=saved.in_place, bytes_written=saved.bytes_written)
+
+
+def apply_plan(
+    entries: Iterable[PlanEntry],
+    *,
+    workers: int = 1,
+    reserve_padding: int = 0,
+    cancel: Optional[threading.Event] = None,
+) -> Iterator[ChangeResult]:
+    """Apply plan entries on `workers` threads, yielding results in plan order."""
+    if workers < 1:
+        raise ValueError("workers must be >= 1")
+
+    def run(entry: PlanEntry) -> ChangeResult:
+        if cancel is not None and cancel.is_set():
+            return entry.to_result(skip_reason="cancelled")
+        return apply_entry(entry, reserve_padding)
+
+    if workers == 1:
+        yield from map(run, entries)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(run, entries)
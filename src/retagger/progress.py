@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+from typing import IO, TYPE_CHECKING, Callable, Iterable, Optional
+
+if TYPE_CHECKING:
+    from retagger.core import ChangeResult
+
+# Seconds between redraws of the CLI status line.
+STATUS_INTERVAL = 0.5
+
+
+def _fmt_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}TB"
+
+
+def _fmt_eta(secs: float) -> str:
+    secs = int(secs)
+    if secs >= 3600:
+        return f"{secs // 3600}h{secs % 3600 // 60:02d}m"
+    if secs >= 60:
+        return f"{secs // 60}m{secs % 60:02d}s"
+    return f"{secs}s"
+
+
+@dataclass
+class ProgressSnapshot:
+    scanned: int
+    changed: int
+    errors: int
+    skipped: int
+    bytes: int
+    discovered: int
+    total: Optional[int]
+    elapsed: float
+    files_per_s: float
+    bytes_per_s: float
+    eta: Optional[float]
+
+    @property
+    def fraction(self) -> float:
+        """Share of the library done; against the files found so far until the count finishes."""
+        known = self.total if self.total is not None else self.discovered
+        return min(1.0, self.scanned / known) if known else 0.0
+
+    def format(self) -> str:
+        if self.total is not None:
+            done = f"{self.scanned}/{self.total}"
+        elif self.discovered:
+            done = f"{self.scanned}/{self.discovered}+"
+        else:
+            done = str(self.scanned)
+        parts = [
+            f"{done} files",
+            f"{self.changed} changed",
+            f"{self.errors} errors",
+            f"{self.files_per_s:.0f} files/s",
+            f"{_fmt_bytes(self.bytes_per_s)}/s",
+        ]
+        if self.eta is not None:
+            # Still counting: the library is at least this big, so the ETA is a floor.
+            parts.append(f"ETA {'' if self.total is not None else '>'}{_fmt_eta(self.eta)}")
+        return ", ".join(parts)
+
+
+class Progress:
+    """
+    Running counts for a library pass, fed by process_library with one add()
+    per file (a few integer updates, so it's cheap on the hot loop) and read
+    from anywhere with snapshot(). Bytes are the bytes actually read to
+    classify each file, mostly just its tag.
+
+    The walker streams files, so the library size isn't known up front.
+    count() walks a second iterator of paths on a background thread; until it
+    finishes, `discovered` is a lower bound on the total and the ETA is too.
+    """
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.scanned = 0
+        self.changed = 0
+        self.errors = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.discovered = 0
+        self.total: Optional[int] = None
+        self._counter: Optional[threading.Thread] = None
+
+    def add(self, result: Optional[ChangeResult], nbytes: int = 0) -> None:
+        self.scanned += 1
+        self.bytes += nbytes
+        if result is None:
+            return
+        if result.error:
+            self.errors += 1
+        elif result.skip_reason:
+            self.skipped += 1
+        elif result.changed:
+            self.changed += 1
+
+    def count(self, paths: Iterable[Path]) -> None:
+        """Count `paths` on a daemon thread to size the run; see the class docstring."""
+
+        def run() -> None:
+            n = 0
+            try:
+                for _ in paths:
+                    n += 1
+                    self.discovered = n
+            except OSError:
+                return
+            self.total = n
+
+        self._counter = threading.Thread(target=run, name="retag-progress-count", daemon=True)
+        self._counter.start()
+
+    def snapshot(self) -> ProgressSnapshot:
+        elapsed = perf_counter() - self.started
+        scanned = self.scanned
+        total = self.total
+        files_per_s = scanned / elapsed if elapsed > 0 else 0.0
+        known = total if total is not None else self.discovered
+        eta = None
+        if known and files_per_s > 0:
+            eta = max(0, known - scanned) / files_per_s
+        return ProgressSnapshot(
+            scanned=scanned,
+            changed=self.changed,
+            errors=self.errors,
+            skipped=self.skipped,
+            bytes=self.bytes,
+            discovered=max(self.discovered, scanned),
+            total=total,
+            elapsed=elapsed,
+            files_per_s=files_per_s,
+            bytes_per_s=self.bytes / elapsed if elapsed > 0 else 0.0,
+            eta=eta,
+        )
+
+
+class StatusLine:
+    """
+    A single self-overwriting progress line for a terminal, redrawn at most
+    every `interval` seconds. `before_draw` runs with the line cleared, so a
+    buffered stdout can be flushed without the two getting mixed up.
+    """
+
+    def __init__(
+        self,
+        progress: Progress,
+        stream: IO[str],
+        interval: float = STATUS_INTERVAL,
+        before_draw: Optional[Callable[[], None]] = None,
+    ):
+        self.progress = progress
+        self.stream = stream
+        self.interval = interval
+        self.before_draw = before_draw
+        self._next = 0.0
+        self._shown = False
+
+    def tick(self) -> None:
+        now = perf_counter()
+        if now < self._next:
+            return
+        self._next = now + self.interval
+        self.clear()
+        if self.before_draw is not None:
+            self.before_draw()
+        self.stream.write(self.progress.snapshot().format())
+        self.stream.flush()
+        self._shown = True
+
+    def clear(self) -> None:
+        if self._shown:
+            self.stream.write("\r\x1b[K")
+            self.stream.flush()
+            self._shown = False
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import errno
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Errors a network filesystem can return for a request that may well succeed
+# if it's simply sent again.
+TRANSIENT_ERRNOS = frozenset(
+    getattr(errno, name)
+    for name in ("EIO", "EAGAIN", "ETIMEDOUT", "ESTALE", "ECONNRESET", "ECONNABORTED", "EHOSTDOWN")
+    if hasattr(errno, name)
+)
+
+# peek_artist's read-ahead in remote mode: a whole typical tag in one request,
+# so mutagen's parse is served from memory instead of paying more round trips.
+REMOTE_READ_AHEAD = 64 * 1024
+
+
+class RemoteIO:
+    """
+    File access for libraries on NFS/SMB. Every open, read and write goes
+    through run(), which retries transient errors (TRANSIENT_ERRNOS) up to
+    `retries` times, sleeping `backoff` seconds before the first retry and
+    twice as long before each one after that.
+
+    `latency` (seconds) and `faults` (a fraction of operations that fail with
+    EIO) simulate a slow, flaky server on local disk, for tests and
+    benchmarks. Reads and writes are delayed the same way, so seeks and
+    tell() stay free as they would be remotely.
+
+    Shared by all worker threads; the counters are only for the summary.
+    """
+
+    def __init__(
+        self,
+        retries: int = 3,
+        backoff: float = 0.05,
+        latency: float = 0.0,
+        faults: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.latency = latency
+        self.faults = faults
+        self.retried = 0
+        self.failed = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def run(self, op: Callable[[], T]) -> T:
+        attempt = 0
+        while True:
+            try:
+                if self.latency:
+                    time.sleep(self.latency)
+                if self.faults and self._fault():
+                    raise OSError(errno.EIO, "simulated I/O error")
+                return op()
+            except OSError as e:
+                if e.errno not in TRANSIENT_ERRNOS or attempt >= self.retries:
+                    if e.errno in TRANSIENT_ERRNOS:
+                        with self._lock:
+                            self.failed += 1
+                    raise
+            with self._lock:
+                self.retried += 1
+            time.sleep(self.backoff * (2**attempt))
+            attempt += 1
+
+    def _fault(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.faults
+
+    def open(self, path: Path, mode: str = "rb") -> RemoteFile:
+        return RemoteFile(self.run(lambda: open(path, mode)), self)
+
+
+class RemoteFile:
+    """
+    The file object RemoteIO.open returns: a binary file whose reads and
+    writes go through RemoteIO.run. A retried read or write starts again
+    from the same offset. pread() is what peek_artist uses instead of
+    os.pread on the descriptor, and like it leaves the position alone.
+    """
+
+    def __init__(self, raw, io: RemoteIO):
+        self._raw = raw
+        self._io = io
+        self.name = raw.name
+
+    def read(self, n: int = -1) -> bytes:
+        if n == 0:
+            return b""
+        pos = self._raw.tell()
+        return self._io.run(lambda: self._at(pos).read(n))
+
+    def pread(self, n: int, offset: int) -> bytes:
+        def op() -> bytes:
+            pos = self._raw.tell()
+            data = self._at(offset).read(n)
+            self._raw.seek(pos)
+            return data
+
+        return self._io.run(op)
+
+    def write(self, data: bytes) -> int:
+        if not data:
+            return 0
+        pos = self._raw.tell()
+        return self._io.run(lambda: self._at(pos).write(data))
+
+    def _at(self, pos: int):
+        self._raw.seek(pos)
+        return self._raw
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._raw.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._raw.tell()
+
+    def truncate(self, size: Optional[int] = None) -> int:
+        return self._io.run(lambda: self._raw.truncate(size))
+
+    def flush(self) -> None:
+        self._io.run(self._raw.flush)
+
+    def fileno(self) -> int:
+        return self._raw.fileno()
+
+    def close(self) -> None:
+        self._raw.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._raw.closed
+
+    def __enter__(self) -> RemoteFile:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
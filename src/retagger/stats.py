@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import heapq
+import threading
+from bisect import bisect_right
+from pathlib import Path
+from time import perf_counter
+from typing import Optional
+
+STAGES = ("walk", "open", "parse", "analyse", "write")
+
+# Upper bounds (seconds) of the histogram buckets; the last bucket is open-ended.
+BUCKETS = (0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1.0)
+
+
+def _bucket_label(i: int) -> str:
+    if i == len(BUCKETS):
+        return f">={_fmt_secs(BUCKETS[-1])}"
+    return f"<{_fmt_secs(BUCKETS[i])}"
+
+
+def _fmt_secs(secs: float) -> str:
+    if secs >= 1:
+        return f"{secs:.2f}s"
+    if secs >= 0.001:
+        return f"{secs * 1e3:.1f}ms"
+    return f"{secs * 1e6:.0f}us"
+
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def add(self, secs: float) -> None:
+        self.count += 1
+        self.total += secs
+        if secs > self.max:
+            self.max = secs
+        self.histogram[bisect_right(BUCKETS, secs)] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_s": self.total / self.count if self.count else 0.0,
+            "max_s": self.max,
+            "histogram": {_bucket_label(i): n for i, n in enumerate(self.histogram)},
+        }
+
+
+class RunStats:
+    """
+    Per-stage timings for a run: walk, open, parse, analyse and write, plus
+    per-file totals broken down by tag format.
+
+    process_file fills a small {stage: seconds} dict per file and the caller
+    feeds it to add_file(); the walk is timed separately with add_walk().
+    Safe to update from several threads (the WriteQueue's writers add their
+    "write" time directly).
+    """
+
+    def __init__(self, slowest: int = 10):
+        self.stages = {name: StageStats() for name in STAGES}
+        self.files = StageStats()
+        # Per-file totals by tag format ("mp3", "flac", ...), for throughput.
+        self.formats: dict[str, StageStats] = {}
+        self.slowest_n = slowest
+        self._slowest: list[tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def add_walk(self, secs: float) -> None:
+        with self._lock:
+            self.stages["walk"].add(secs)
+
+    def add_stage(self, stage: str, secs: float) -> None:
+        with self._lock:
+            self.stages[stage].add(secs)
+
+    def add_file(self, path: Path, timings: dict, fmt: Optional[str] = None) -> None:
+        total = sum(timings.values())
+        with self._lock:
+            for stage, secs in timings.items():
+                self.stages[stage].add(secs)
+            self.files.add(total)
+            if fmt is not None:
+                self.formats.setdefault(fmt, StageStats()).add(total)
+            entry = (total, str(path))
+            if len(self._slowest) < self.slowest_n:
+                heapq.heappush(self._slowest, entry)
+            elif entry > self._slowest[0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self) -> list[tuple[float, str]]:
+        return sorted(self._slowest, reverse=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "files": self.files.to_dict(),
+            "stages": {name: s.to_dict() for name, s in self.stages.items()},
+            "formats": {
+                name: {**s.to_dict(), "files_per_s": s.count / s.total if s.total else 0.0}
+                for name, s in sorted(self.formats.items())
+            },
+            "slowest": [{"path": p, "total_s": t} for t, p in self.slowest()],
+        }
+
+    def summary(self) -> str:
+        lines = [f"Per-stage timings ({self.files.count} files processed):"]
+        for name, s in self.stages.items():
+            if not s.count:
+                continue
+            mean = s.total / s.count
+            lines.append(
+                f"  {name:8s} total {s.total:8.3f}s  mean {_fmt_secs(mean):>8s}  "
+                f"max {_fmt_secs(s.max):>8s}  n={s.count}"
+            )
+        if self.formats:
+            lines.append("Per-format throughput (time spent in files of each format):")
+            for name, s in sorted(self.formats.items()):
+                rate = s.count / s.total if s.total else 0.0
+                lines.append(
+                    f"  {name:8s} {s.count:8d} files  total {s.total:8.3f}s  {rate:10.0f} files/s"
+                )
+        if self.files.count:
+            lines.append("Per-file time histogram:")
+            peak = max(self.files.histogram) or 1
+            for i, n in enumerate(self.files.histogram):
+                if n:
+                    bar = "#" * max(1, round(30 * n / peak))
+                    lines.append(f"  {_bucket_label(i):>8s} {n:8d} {bar}")
+        slow = self.slowest()
+        if slow:
+            lines.append(f"Slowest {len(slow)} files:")
+            for t, p in slow:
+                lines.append(f"  {_fmt_secs(t):>8s}  {p}")
+        return "\n".join(lines)
+
+
+def timed_iter(it, stats: Optional[RunStats]):
+    """Yield from `it`, charging the time spent producing each item to the walk stage."""
+    if stats is None:
+        yield from it
+        return
+    it = iter(it)
+    while True:
+        start = perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            stats.add_walk(perf_counter() - start)
+            return
+        stats.add_walk(perf_counter() - start)
+        yield item
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from retagger.core import (
+    ChangeResult,
+    RetagConfig,
+    analyse_file,
+    audio_extensions,
+    error_result,
+    iter_audio_files,
+    open_file,
+)
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+EVENT_HEADER = struct.Struct("iIII")
+
+# How many recently processed files to remember, so events for files that
+# haven't changed since (our own saves included) are ignored.
+PROCESSED_MEMORY = 4096
+
+
+def _is_audio(name: str) -> bool:
+    return name.lower().endswith(audio_extensions())
+
+
+def _changed_ns(st: os.stat_result) -> int:
+    # A rename (mv from a staging folder) or cp -p / rsync -a keeps the old
+    # mtime but still sets the ctime.
+    return max(st.st_mtime_ns, st.st_ctime_ns)
+
+
+def retag_file(path: Path, config: RetagConfig) -> Optional[ChangeResult]:
+    """
+    process_file, except the file is only opened for writing when there's a
+    change to save, so unchanged files don't send IN_CLOSE_WRITE to us or to
+    other watchers (media servers) on the same folder.
+    """
+    result, tags = analyse_file(path, config)
+    if tags is None:
+        return result
+    with open_file(path, "rb+", config.io) as fh:
+        saved = tags.save(fh, config.reserve_padding)
+    result.in_place = saved.in_place
+    result.bytes_written = saved.bytes_written
+    return result
+
+
+class PollingWatcher:
+    """
+    Portable fallback: re-walk the tree every `interval` seconds and report
+    files modified, or moved or copied in, since the previous walk started
+    (by mtime or ctime). Only that timestamp is kept between walks, so
+    memory doesn't grow with the library.
+    """
+
+    def __init__(self, root: Path, interval: float = 10.0):
+        self.root = root
+        self.interval = interval
+        self._since = time.time_ns()
+        self._next = time.monotonic() + interval
+
+    def poll(self, timeout: float) -> Iterator[Path]:
+        wait = self._next - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if time.monotonic() < self._next:
+                return
+        started = time.time_ns()
+        for p in iter_audio_files(self.root):
+            try:
+                if _changed_ns(os.stat(p)) >= self._since:
+                    yield p
+            except OSError:
+                continue
+        self._since = started
+        self._next = time.monotonic() + self.interval
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+    Linux inotify watcher (via libc, no extra dependency). Every directory
+    under root gets a watch, so memory scales with the number of folders,
+    not files. New folders are watched, and scanned once, as they appear.
+    """
+
+    def __init__(self, root: Path):
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or not libc_name:
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.root = root
+        self._dirs: dict[int, str] = {}
+        self._backlog: list[Path] = []
+        self.overflowed = False
+        self._add_tree(str(root), scan=False)
+
+    def _add_watch(self, path: str) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch failed for {path}: {os.strerror(err)}")
+        self._dirs[wd] = path
+
+    def _add_tree(self, top: str, scan: bool) -> None:
+        for dirpath, dirnames, filenames in os.walk(top):
+            self._add_watch(dirpath)
+            if scan:
+                # Files may have landed before the watch existed.
+                self._backlog.extend(Path(dirpath, f) for f in filenames if _is_audio(f))
+
+    def poll(self, timeout: float) -> Iterator[Path]:
+        if self._backlog:
+            backlog, self._backlog = self._backlog, []
+            yield from backlog
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                self._dirs.pop(wd, None)
+                continue
+            parent = self._dirs.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._add_tree(path, scan=True)
+                    except OSError:
+                        continue
+            elif _is_audio(name):
+                yield Path(path)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def make_watcher(root: Path, *, poll: bool = False, interval: float = 10.0):
+    if not poll:
+        try:
+            return InotifyWatcher(root)
+        except OSError:
+            pass
+    return PollingWatcher(root, interval)
+
+
+def watch(
+    root: Path,
+    config: RetagConfig,
+    on_result: Callable[[Path, Optional[ChangeResult]], None],
+    *,
+    debounce: float = 2.0,
+    poll: bool = False,
+    interval: float = 10.0,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """
+    Run until `stop` is set, passing new or modified audio files under root
+    through retag_file once they've settled: no events for `debounce`
+    seconds and the same size/mtime on two consecutive checks, so files that
+    are still downloading are left alone. Only files currently settling and
+    the last PROCESSED_MEMORY processed ones are held in memory.
+    """
+    watcher = make_watcher(root, poll=poll, interval=interval)
+    started_ns = time.time_ns()
+    # path -> (size, mtime_ns, monotonic time of last change)
+    pending: dict[Path, tuple[int, int, float]] = {}
+    # path -> (size, mtime_ns) when last processed, whether or not it was
+    # changed, so events that leave a file as it was (our own save included)
+    # don't send it round again.
+    processed: dict[Path, tuple[int, int]] = {}
+
+    def note(p: Path) -> None:
+        try:
+            st = os.stat(p)
+        except OSError:
+            pending.pop(p, None)
+            return
+        if processed.get(p) == (st.st_size, st.st_mtime_ns):
+            return
+        pending[p] = (st.st_size, st.st_mtime_ns, time.monotonic())
+
+    try:
+        while stop is None or not stop.is_set():
+            for p in watcher.poll(timeout=min(debounce, 1.0)):
+                note(p)
+
+            if getattr(watcher, "overflowed", False):
+                # Events were lost; catch up on anything modified since we started.
+                watcher.overflowed = False
+                for p in iter_audio_files(root):
+                    try:
+                        if _changed_ns(os.stat(p)) >= started_ns:
+                            note(p)
+                    except OSError:
+                        continue
+
+            now = time.monotonic()
+            for p, (size, mtime_ns, seen) in list(pending.items()):
+                if now - seen < debounce:
+                    continue
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    del pending[p]
+                    continue
+                if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                    # Still being written; check again after another quiet period.
+                    pending[p] = (st.st_size, st.st_mtime_ns, now)
+                    continue
+                del pending[p]
+                try:
+                    result = retag_file(p, config)
+                except Exception as e:
+                    result = error_result(p, e)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    pass
+                else:
+                    processed.pop(p, None)
+                    processed[p] = (st.st_size, st.st_mtime_ns)
+                    if len(processed) > PROCESSED_MEMORY:
+                        del processed[next(iter(processed))]
+                on_result(p, result)
+    finally:
+        watcher.close()
@@ -0,0 +1,52 @@
+import time
+
+from mutagen.id3 import ID3, TIT2, TPE1
+
+from retagger.cache import ScanCache
+from retagger.core import RetagConfig, process_library
+
+
+def make_mp3(path, artist):
+    path.write_bytes(b"\xff\xfb\x90\x00" + b"\0" * 4000)
+    id3 = ID3()
+    id3.add(TPE1(encoding=3, text=artist))
+    id3.add(TIT2(encoding=3, text="Song"))
+    id3.save(path, v2_version=3)
+
+
+def run(paths, config, cache_path):
+    cache = ScanCache(cache_path, config)
+    results = [r for _, r in process_library(paths, config, cache=cache)]
+    cache.close()
+    return cache, results
+
+
+def test_write_run_does_not_count_replayed_dry_run_changes(tmp_path):
+    paths = [tmp_path / "feat.mp3", tmp_path / "solo.mp3"]
+    make_mp3(paths[0], "Main/Feat")
+    make_mp3(paths[1], "Solo")
+    cache_path = tmp_path / "cache.sqlite"
+
+    run(paths, RetagConfig(), cache_path)
+    cache, results = run(paths, RetagConfig(write=True), cache_path)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert results[0].changed and results[1] is None
+
+
+def test_album_counts_hits_only_when_every_track_hits(tmp_path):
+    album = tmp_path / "album"
+    album.mkdir()
+    paths = [album / "1.mp3", album / "2.mp3"]
+    for p in paths:
+        make_mp3(p, "Solo")
+    config = RetagConfig(group_albums=True)
+    cache_path = tmp_path / "cache.sqlite"
+
+    run(paths, config, cache_path)
+    cache, _ = run(paths, config, cache_path)
+    assert (cache.hits, cache.misses) == (2, 0)
+
+    time.sleep(0.01)
+    make_mp3(paths[1], "Solo")
+    cache, _ = run(paths, config, cache_path)
+    assert (cache.hits, cache.misses) == (0, 2)
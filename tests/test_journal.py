@@ -0,0 +1,53 @@
+from mutagen.id3 import ID3, TIT2, TPE1, TPE2
+
+from retagger.core import RetagConfig, process_library
+from retagger.journal import Journal, read_journal, undo_journal
+
+
+def make_mp3(path, *frames):
+    path.write_bytes(b"\xff\xfb\x90\x00" + b"\0" * 4000)
+    id3 = ID3()
+    for frame in frames:
+        id3.add(frame)
+    id3.save(path, v2_version=3)
+
+
+def write_and_undo(tmp_path, path):
+    config = RetagConfig(write=True)
+    log = tmp_path / "run.journal"
+    journal = Journal(log, config)
+    results = [r for _, r in process_library([path], config, journal=journal)]
+    journal.close()
+    assert results[0] is not None and results[0].changed
+    undone = list(undo_journal(log))
+    assert undone[0].changed and not undone[0].error
+    return log
+
+
+def test_undo_takes_out_a_title_the_file_never_had(tmp_path):
+    path = tmp_path / "track.mp3"
+    make_mp3(path, TPE1(encoding=3, text="Main/Feat"))
+
+    log = write_and_undo(tmp_path, path)
+    write = next(r for r in read_journal(log) if r.get("type") == "write")
+    assert write["old"]["title"] is None
+
+    id3 = ID3(path)
+    assert str(id3["TPE1"]) == "Main/Feat"
+    assert "TIT2" not in id3
+
+
+def test_undo_restores_title_and_albumartist(tmp_path):
+    path = tmp_path / "track.mp3"
+    make_mp3(
+        path,
+        TPE1(encoding=3, text="Main/Feat"),
+        TIT2(encoding=3, text="Song"),
+        TPE2(encoding=3, text="Band"),
+    )
+
+    write_and_undo(tmp_path, path)
+    id3 = ID3(path)
+    assert str(id3["TPE1"]) == "Main/Feat"
+    assert str(id3["TIT2"]) == "Song"
+    assert str(id3["TPE2"]) == "Band"
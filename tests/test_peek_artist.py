@@ -0,0 +1,82 @@
+import io
+
+from retagger.core import PEEK_SIZE, peek_albumartist, peek_artist
+
+
+def synchsafe(n: int) -> bytes:
+    return bytes([(n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F])
+
+
+def frame(frame_id: bytes, body: bytes, major: int) -> bytes:
+    size = synchsafe(len(body)) if major == 4 else len(body).to_bytes(4, "big")
+    return frame_id + size + b"\0\0" + body
+
+
+def tag(frames: list[bytes], major: int = 3, padding: int = 0) -> bytes:
+    body = b"".join(frames) + b"\0" * padding
+    return b"ID3" + bytes([major, 0, 0]) + synchsafe(len(body)) + body + b"\xff\xfb" * 64
+
+
+class PreadFile(io.BytesIO):
+    """In-memory file with the pread peek_artist uses, counting calls."""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.preads = []
+
+    def pread(self, n: int, offset: int) -> bytes:
+        self.preads.append((n, offset))
+        return self.getvalue()[offset : offset + n]
+
+
+def test_tpe1_in_first_read():
+    fh = PreadFile(tag([frame(b"TPE1", b"\x00A/B", 3)], padding=100))
+    artist, _ = peek_artist(fh)
+    assert artist == "A/B"
+    assert len(fh.preads) == 1
+
+
+def test_tpe1_past_read_ahead_reads_rest_of_tag():
+    priv = frame(b"PRIV", b"owner\0" + b"x" * 8192, 3)
+    fh = PreadFile(tag([priv, frame(b"TPE1", b"\x00Main/Feat", 3)]))
+    artist, head = peek_artist(fh)
+    assert artist == "Main/Feat"
+    assert fh.preads[0] == (10 + PEEK_SIZE, 0)
+    assert len(fh.preads) == 2
+    assert len(head) > 10 + PEEK_SIZE
+
+
+def test_v24_synchsafe_frame_size():
+    # 200 bytes is 0x01 0x48 synchsafe; read as a plain integer it would be 328.
+    txxx = frame(b"TXXX", b"\x00desc\0" + b"v" * 194, 4)
+    fh = PreadFile(tag([txxx, frame(b"TPE1", b"\x03Caf\xc3\xa9", 4)], major=4))
+    artist, _ = peek_artist(fh)
+    assert artist == "Café"
+
+
+def test_utf16_with_bom():
+    body = b"\x01" + "Björk/Thom".encode("utf-16") + b"\0\0"
+    fh = PreadFile(tag([frame(b"TPE1", body, 3)], padding=10))
+    artist, _ = peek_artist(fh)
+    assert artist == "Björk/Thom"
+
+
+def test_no_tpe1_leaves_it_to_mutagen():
+    fh = PreadFile(tag([frame(b"TIT2", b"\x00Title", 3)], padding=10))
+    artist, _ = peek_artist(fh)
+    assert artist is None
+
+
+def test_albumartist_present_after_tpe1():
+    head = tag([frame(b"TPE1", b"\x00Solo", 3), frame(b"TPE2", b"\x00Band", 3)], padding=10)
+    assert peek_albumartist(head) == "Band"
+
+
+def test_albumartist_known_absent():
+    head = tag([frame(b"TPE1", b"\x00Solo", 3)], padding=10)
+    assert peek_albumartist(head) == ""
+
+
+def test_albumartist_unknown_when_head_is_short():
+    head = tag([frame(b"TPE1", b"\x00Solo", 3), frame(b"TPE2", b"\x00Band", 3)])
+    assert peek_albumartist(head[:30]) is None
@@ -0,0 +1,41 @@
+from mutagen.id3 import ID3, TALB, TCON, TDRC, TIT2, TPE1, TRCK
+
+from retagger.core import RetagConfig, process_file
+
+
+def make_mp3(path, **frames):
+    path.write_bytes(b"\xff\xfb\x90\x00" + b"\0" * 4000)
+    id3 = ID3()
+    for frame in frames.values():
+        id3.add(frame)
+    id3.save(path, v2_version=3, v1=2)
+
+
+def test_write_keeps_id3v1_fields(tmp_path):
+    path = tmp_path / "track.mp3"
+    make_mp3(
+        path,
+        artist=TPE1(encoding=3, text="Main/Feat"),
+        title=TIT2(encoding=3, text="Song"),
+        album=TALB(encoding=3, text="Album"),
+        year=TDRC(encoding=3, text="1999"),
+        track=TRCK(encoding=3, text="5"),
+        genre=TCON(encoding=3, text="Rock"),
+    )
+
+    result = process_file(path, RetagConfig(write=True))
+    assert result is not None and result.changed and not result.error
+
+    v1 = path.read_bytes()[-128:]
+    assert v1[:3] == b"TAG"
+    assert v1[3:33].rstrip(b"\0") == b"Song (ft. Feat)"
+    assert v1[33:63].rstrip(b"\0") == b"Main"
+    assert v1[63:93].rstrip(b"\0") == b"Album"
+    assert v1[93:97] == b"1999"
+    assert v1[126] == 5
+    assert v1[127] == 17  # Rock
+
+    id3 = ID3(path)
+    assert str(id3["TPE1"]) == "Main"
+    assert str(id3["TIT2"]) == "Song (ft. Feat)"
+    assert str(id3["TALB"]) == "Album"
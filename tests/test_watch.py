@@ -0,0 +1,59 @@
+import os
+import threading
+import time
+from collections import Counter
+
+from mutagen.id3 import ID3, TIT2, TPE1
+
+from retagger.core import RetagConfig
+from retagger.watch import watch
+
+
+def make_mp3(path, artist=None):
+    path.write_bytes(b"\xff\xfb\x90\x00" + b"\0" * 4000)
+    if artist is not None:
+        id3 = ID3()
+        id3.add(TPE1(encoding=3, text=artist))
+        id3.add(TIT2(encoding=3, text="Song"))
+        id3.save(path, v2_version=3)
+
+
+def run_watch(root, seconds, setup, poll=False):
+    seen = Counter()
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=watch,
+        args=(root, RetagConfig(write=True), lambda p, r: seen.update([p.name])),
+        kwargs={"debounce": 0.2, "poll": poll, "interval": 0.2, "stop": stop},
+    )
+    thread.start()
+    time.sleep(0.3)
+    setup()
+    time.sleep(seconds)
+    stop.set()
+    thread.join()
+    return seen
+
+
+def test_write_mode_processes_each_file_once(tmp_path):
+    def setup():
+        make_mp3(tmp_path / "single.mp3", "Solo")
+        make_mp3(tmp_path / "untagged.mp3")
+        make_mp3(tmp_path / "feat.mp3", "Main/Feat")
+
+    seen = run_watch(tmp_path, 2.0, setup)
+    assert seen == {"single.mp3": 1, "untagged.mp3": 1, "feat.mp3": 1}
+    assert str(ID3(tmp_path / "feat.mp3")["TPE1"]) == "Main"
+
+
+def test_polling_sees_files_moved_in_with_old_mtime(tmp_path):
+    staging = tmp_path.parent / (tmp_path.name + "-staging")
+    staging.mkdir()
+    old = staging / "moved.mp3"
+    make_mp3(old, "Main/Feat")
+    # As if it had been downloaded a day ago, then moved into the library.
+    stamp = time.time() - 86400
+    os.utime(old, (stamp, stamp))
+
+    seen = run_watch(tmp_path, 1.0, lambda: old.rename(tmp_path / "moved.mp3"), poll=True)
+    assert seen == {"moved.mp3": 1}